@@ -2,18 +2,22 @@ from django.contrib import admin
 from django.contrib.auth.admin import GroupAdmin as DjangoGroupAdmin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group as DjangoGroup
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from django_better_admin_arrayfield.admin.mixins import DynamicArrayMixin
 from rangefilter.filters import DateTimeRangeFilter
 
 from main.admin import filters
+from main.cache import invalidate_lesson_boards
 from main.choices import Role
 from main.forms import PaymentForm, BookChangeForm
 from main.forms import TerminalForm
 from main.models import AbsenceReason
+from main.models import BalanceEntry
 from main.models import Book
 from main.models import Branch
 from main.models import CeleryTask
+from main.models import Closure
 from main.models import EarningRate
 from main.models import Group
 from main.models import Inventory
@@ -31,6 +35,31 @@ admin.site.register(Subject)
 admin.site.unregister(DjangoGroup)
 
 
+class AttendanceBoardMixin:
+    """
+    Drops cached attendance boards showing an object edited in the admin,
+    both the ones it was shown on before the change and after.
+    """
+
+    def board_lessons(self, objs):
+        """Lessons the objects are shown with."""
+        raise NotImplementedError
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            invalidate_lesson_boards(self.board_lessons([obj]))
+        super().save_model(request, obj, form, change)
+        invalidate_lesson_boards(self.board_lessons([obj]))
+
+    def delete_model(self, request, obj):
+        invalidate_lesson_boards(self.board_lessons([obj]))
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        invalidate_lesson_boards(self.board_lessons(queryset))
+        super().delete_queryset(request, queryset)
+
+
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
     fields = ('name', 'batch_price', 'single_price', 'max_student_count', 'created_at')
@@ -74,16 +103,19 @@ class DjangoGroupAdmin(DjangoGroupAdmin):
 class GroupAdmin(admin.ModelAdmin):
     readonly_fields = ('started_at',)
     list_display = ('name', 'level', 'days_type', 'start_time', 'current_teacher',
-                    'max_student_count',
+                    'max_student_count', 'student_count',
                     )
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(AttendanceBoardMixin, admin.ModelAdmin):
     list_display = 'id', 'group', 'completion_timestamp', 'took_place'
     readonly_fields = 'took_place',
     list_filter = 'took_place',
 
+    def board_lessons(self, objs):
+        return Lesson.objects.filter(pk__in=[obj.pk for obj in objs])
+
 
 @admin.register(AbsenceReason)
 class AbsenceReasonAdmin(admin.ModelAdmin):
@@ -91,10 +123,16 @@ class AbsenceReasonAdmin(admin.ModelAdmin):
 
 
 @admin.register(StudentLesson)
-class StudentLesson(admin.ModelAdmin):
+class StudentLesson(AttendanceBoardMixin, admin.ModelAdmin):
     list_display = 'id', 'lesson', 'student', 'absence_reason', 'lesson_price'
     list_editable = 'absence_reason',
 
+    def board_lessons(self, objs):
+        return Lesson.objects.filter(
+            Q(pk__in=[obj.lesson_id for obj in objs])
+            | Q(studentlesson__in=[obj.pk for obj in objs])
+        )
+
 
 admin.site.register(EarningRate)
 
@@ -105,6 +143,13 @@ class BranchAdmin(admin.ModelAdmin):
     list_editable = 'address',
 
 
+@admin.register(Closure)
+class ClosureAdmin(admin.ModelAdmin):
+    list_display = 'date', 'branch', 'reason'
+    list_filter = 'branch',
+    date_hierarchy = 'date'
+
+
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
     list_display = 'name', 'responsible', 'created', 'last_changed'
@@ -124,6 +169,23 @@ class InventoryAdmin(admin.ModelAdmin):
         return super().get_form(request, obj, change, **kwargs)
 
 
+@admin.register(BalanceEntry)
+class BalanceEntryAdmin(admin.ModelAdmin):
+    list_display = '__str__', 'student', 'kind', 'amount', 'payment', 'created_at'
+    search_fields = 'student__phone', 'student__first_name', 'student__last_name'
+    list_filter = 'kind',
+    raw_id_fields = 'student', 'payment'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     readonly_fields = 'created',
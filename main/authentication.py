@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.crypto import salted_hmac
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claims of the user copied into every token, see BranchUser
+USER_CLAIMS = ('branch_id', 'branch', 'role', 'fullname', 'is_superuser')
+
+
+def user_active_key(user_id) -> str:
+    return f'jwt-user-active:{user_id}'
+
+
+def clear_user_active(user_id):
+    cache.delete(user_active_key(user_id))
+
+
+class BranchRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['branch_id'] = user.branch_id
+        token['branch'] = user.branch.name if user.branch_id else None
+        token['role'] = user.role
+        token['fullname'] = user.fullname
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class BranchUser(TokenUser):
+    """
+    Authenticated user built from token claims only, views get branch_id,
+    role and fullname without a query. Relations take the id, e.g.
+    `curator_id=request.user.id`.
+    """
+
+    @cached_property
+    def branch_id(self):
+        return self.token.get('branch_id')
+
+    @cached_property
+    def branch_name(self):
+        return self.token.get('branch')
+
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+    @cached_property
+    def fullname(self):
+        return self.token.get('fullname') or ''
+
+
+class BranchJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication which trusts the user claims of the token instead of
+    loading the user. Whether the user is still active is cached for
+    JWT_USER_CACHE_TIMEOUT and dropped when the user is saved, so a
+    deactivated user is locked out at once. Tokens issued before the claims
+    existed still load the user.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        user = BranchUser(validated_token)
+        key = user_active_key(user.id)
+        is_active = cache.get(key)
+        if is_active is None:
+            is_active = get_user_model().objects.filter(pk=user.id, is_active=True).exists()
+            cache.set(key, is_active, settings.JWT_USER_CACHE_TIMEOUT)
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication which hashes the password once per
+    BASIC_AUTH_CACHE_TIMEOUT instead of on every request. A successful
+    check is cached under an HMAC of the credentials along with an HMAC
+    of the stored password hash, so a password change invalidates it.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = 'basic-auth:' + salted_hmac('basic-auth', f'{userid}:{password}').hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            user_id, fingerprint = cached
+            user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+            if user is not None and constant_time_compare(
+                    fingerprint, self.password_fingerprint(user)):
+                return user, None
+            cache.delete(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(key, (user.pk, self.password_fingerprint(user)),
+                  settings.BASIC_AUTH_CACHE_TIMEOUT)
+        return user, auth
+
+    @staticmethod
+    def password_fingerprint(user) -> str:
+        return salted_hmac('basic-auth-password', user.password).hexdigest()
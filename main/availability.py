@@ -0,0 +1,92 @@
+from datetime import date
+
+from main.choices import Time
+from main.models import Group
+from main.models import Lesson
+from main.models import Teacher
+
+SLOT_TIMES = tuple(Time.values)
+DAY_PATTERNS = (0, 1)
+
+
+def day_pattern(days_type) -> int:
+    """Group.days maps every non-zero days_type to Tue/Thu/Sat."""
+    return 1 if days_type else 0
+
+
+def date_pattern(day: date):
+    """Pattern of the weekday, None for Sunday."""
+    weekday = day.weekday()
+    return None if weekday == 6 else weekday % 2
+
+
+def slot_bit(days_type, start_time) -> int:
+    return 1 << (day_pattern(days_type) * len(SLOT_TIMES) + SLOT_TIMES.index(start_time))
+
+
+class AvailabilityIndex:
+    """
+    Busy slots of every teacher of a branch, one bitset per teacher over
+    (days pattern x lesson time). Built with a couple of queries, then every
+    question is answered with bit operations only.
+    """
+
+    def __init__(self, teachers, busy, day=None):
+        self.teachers = teachers
+        self.busy = busy
+        self.day = day
+
+    @classmethod
+    def for_branch(cls, branch_id, day: date = None):
+        teachers = list(Teacher.objects.filter(branch_id=branch_id).only(
+            'id', 'fullname', 'phone',
+        ))
+        busy = dict.fromkeys((teacher.id for teacher in teachers), 0)
+        groups = Group.objects.filter(
+            branch_id=branch_id,
+            current_teacher__isnull=False,
+        ).values_list('current_teacher_id', 'days_type', 'start_time')
+        for teacher_id, days_type, start_time in groups:
+            if teacher_id in busy:
+                busy[teacher_id] |= slot_bit(days_type, start_time)
+        if day is not None:
+            cls.apply_lessons(busy, branch_id, day)
+        return cls(teachers, busy, day)
+
+    @staticmethod
+    def apply_lessons(busy, branch_id, day: date):
+        """
+        Override the weekly picture with lessons of the date: cancelled
+        lessons free the slot, substitutions move it to another teacher.
+        """
+        pattern = date_pattern(day)
+        if pattern is None:
+            return
+        lessons = Lesson.objects.filter(
+            group__branch_id=branch_id,
+            completion_timestamp__date=day,
+        ).values_list('teacher_id', 'group__current_teacher_id',
+                      'completion_timestamp__hour', 'took_place')
+        for teacher_id, current_teacher_id, hour, took_place in lessons:
+            if hour not in SLOT_TIMES:
+                continue
+            bit = slot_bit(pattern, hour)
+            if current_teacher_id in busy and (took_place is False or
+                                               current_teacher_id != teacher_id):
+                busy[current_teacher_id] &= ~bit
+            if teacher_id in busy and took_place is not False:
+                busy[teacher_id] |= bit
+
+    def free_teachers(self, days_type, start_time):
+        bit = slot_bit(days_type, start_time)
+        return [teacher for teacher in self.teachers if not self.busy[teacher.id] & bit]
+
+    def free_slots(self, teacher_id):
+        mask = self.busy.get(teacher_id, 0)
+        patterns = DAY_PATTERNS if self.day is None else (date_pattern(self.day),)
+        return [
+            (pattern, start_time)
+            for pattern in patterns if pattern is not None
+            for start_time in SLOT_TIMES
+            if not mask & slot_bit(pattern, start_time)
+        ]
@@ -0,0 +1,95 @@
+import hashlib
+import time
+from collections import defaultdict
+from datetime import date
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import is_aware
+from django.utils.timezone import localtime
+
+from main.models import Lesson
+
+# Groups looked up per query when invalidating boards by student status
+STATUS_BOARDS_BATCH_SIZE = 200
+
+
+def _local_date(value) -> date:
+    if isinstance(value, datetime):
+        return localtime(value).date() if is_aware(value) else value.date()
+    return value
+
+
+def _board_version_key(branch_id, day: date) -> str:
+    return f'attendance-board:{branch_id}:{day.isoformat()}'
+
+
+def get_board(branch_id, day: date, params, build):
+    """
+    Return the serialized attendance board of a branch for one day. The
+    board is built with `build()` once and shared by every poll until one
+    of the invalidate_* helpers below touches that (branch, day).
+    """
+    timeout = settings.ATTENDANCE_BOARD_CACHE_TIMEOUT
+    version_key = _board_version_key(branch_id, day)
+    version = cache.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(version_key, version, timeout):
+            version = cache.get(version_key, version)
+
+    digest = hashlib.md5(str(sorted(params.lists())).encode()).hexdigest()
+    key = f'{version_key}:{version}:{digest}'
+    data = cache.get(key)
+    if data is None:
+        data = list(build())
+        cache.set(key, data, timeout)
+    return data
+
+
+def invalidate_boards(branch_id, days):
+    """Drop cached boards of the branch for the given dates or datetimes."""
+    keys = {_board_version_key(branch_id, _local_date(day)) for day in days}
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def _lesson_board_keys(lessons) -> set:
+    return {
+        _board_version_key(branch_id, _local_date(timestamp))
+        for branch_id, timestamp in lessons.values_list(
+            'group__branch_id', 'completion_timestamp',
+        ).distinct()
+    }
+
+
+def invalidate_lesson_boards(lessons):
+    """
+    Drop cached boards that show any of the lessons of the queryset. The
+    boards are looked up right away, so it may be called before the lessons
+    are changed or deleted.
+    """
+    keys = _lesson_board_keys(lessons)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def invalidate_status_boards(pairs):
+    """Drop cached boards that show the status of given (student, group) pairs."""
+    students = defaultdict(set)
+    for student_id, group_id in pairs:
+        students[group_id].add(student_id)
+    groups = list(students.items())
+    keys = set()
+    for start in range(0, len(groups), STATUS_BOARDS_BATCH_SIZE):
+        keys |= _lesson_board_keys(Lesson.objects.filter(reduce(or_, (
+            Q(group_id=group_id, studentlesson__student_id__in=student_ids)
+            for group_id, student_ids in groups[start:start + STATUS_BOARDS_BATCH_SIZE]
+        ))))
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
@@ -51,6 +51,26 @@ class Plan(IntegerChoices):
     ADDITIONAL = 2, _('additional')
 
 
+class BalanceEntryKind(TextChoices):
+    OPENING = 'opening', _('opening balance')
+    TERMINAL_PAYMENT = 'terminal_payment', _('terminal payment')
+    MANUAL_PAYMENT = 'manual_payment', _('manual payment')
+    TRANSFER_IN = 'transfer_in', _('transfer in')
+    TRANSFER_OUT = 'transfer_out', _('transfer out')
+    LESSONS = 'lessons', _('lessons')
+    LOAN = 'loan', _('loan lesson')
+    REFUND = 'refund', _('refund')
+    BOOK = 'book', _('book')
+
+
+class EnrollmentState(TextChoices):
+    TRIAL = 'trial', _('trial')
+    ACTIVE = 'active', _('active')
+    COMPLETED = 'completed', _('completed')
+    NO_LESSON = 'no_lesson', _('no lesson')
+    INACTIVE = 'inactive', _('inactive')
+
+
 class TaskStatus(TextChoices):
     PENDING = 'pending', _('pending')
     STARTED = 'started', _('started')
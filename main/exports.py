@@ -0,0 +1,65 @@
+import csv
+import json
+
+from django.utils.timezone import localtime
+
+from main.models import StudentLesson
+
+ATTENDANCE_EXPORT_FIELDS = (
+    'lesson', 'completion_timestamp', 'group', 'teacher', 'student',
+    'has_participated', 'absence_reason', 'lesson_price',
+)
+
+
+class Echo:
+    """File-like object which returns written value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def attendance_rows(lessons, chunk_size=2000):
+    """
+    Yield one export row per student lesson of given lessons. Rows are read
+    through a server-side cursor, so memory does not depend on the range.
+    """
+    student_lessons = StudentLesson.objects.filter(
+        lesson_id__in=lessons.values('id'),
+    ).order_by(
+        'lesson__completion_timestamp', 'lesson_id', 'id',
+    ).values_list(
+        'lesson_id',
+        'lesson__completion_timestamp',
+        'lesson__group__name',
+        'lesson__teacher__fullname',
+        'student__last_name',
+        'student__first_name',
+        'student__middle_name',
+        'has_participated',
+        'absence_reason__name',
+        'lesson_price',
+    )
+    for (lesson_id, timestamp, group, teacher, last_name, first_name, middle_name,
+         has_participated, absence_reason, lesson_price) in student_lessons.iterator(chunk_size):
+        yield (
+            lesson_id,
+            localtime(timestamp).isoformat(),
+            group,
+            teacher,
+            f'{last_name or ""} {first_name or ""} {middle_name or ""}'.strip(),
+            has_participated,
+            absence_reason or '',
+            str(lesson_price),
+        )
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ATTENDANCE_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(ATTENDANCE_EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
@@ -10,4 +10,5 @@ from .inventory import BookFilter
 from .pending import PendingFilter
 from .plan import PlanFilter
 from .student import StudentFilter
+from .studentlesson import ArchivedStudentLessonFilter
 from .studentlesson import StudentLessonFilter
@@ -1,4 +1,4 @@
-from django.db.models import Count, F
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import FilterSet
 from django_filters import rest_framework as filters
@@ -38,8 +38,12 @@ class GroupFilter(FilterSet):
         }
 
     def by_student(self, queryset, field_name, value, *args, **kwargs):
+        # same expression as group_free_places_idx
+        queryset = queryset.alias(
+            free_places=F('max_student_count') - F('student_count'),
+        )
         if value == 'not_enough':
-            return queryset.filter(student_count__lt=F('max_student_count'))
+            return queryset.filter(free_places__gt=0)
         if value == 'over':
-            return queryset.filter(student_count__gt=F('max_student_count'))
-        return queryset.filter(student_count=F('max_student_count'))
+            return queryset.filter(free_places__lt=0)
+        return queryset.filter(free_places=0)
@@ -11,3 +11,13 @@ class StudentLessonFilter(FilterSet):
             'lesson__group': ['exact'],
             'lesson__completion_timestamp': ['range', 'year', 'month'],
         }
+
+
+class ArchivedStudentLessonFilter(FilterSet):
+    class Meta:
+        model = models.ArchivedStudentLesson
+        fields = {
+            'student': ['exact'],
+            'lesson__group': ['exact'],
+            'lesson__completion_timestamp': ['range', 'year', 'month'],
+        }
@@ -2,6 +2,8 @@ from django import forms
 from django.db.transaction import atomic
 from django.utils.translation import gettext_lazy as _
 
+from main.choices import BalanceEntryKind
+from main.models import BalanceEntry
 from main.models import Book
 from main.models import History
 from main.models import Payment
@@ -20,20 +22,36 @@ class PaymentForm(forms.ModelForm):
 
     class Meta:
         model = Payment
-        exclude = ()
+        exclude = ('idempotency_key',)
 
     @atomic
     def save(self, commit=True):
+        # The ledger entry refers to the payment, so it is posted once the
+        # payment is saved: right away, or by save_m2m() after the caller
+        # has saved it when commit is False
         instance = super(PaymentForm, self).save(commit)
+        if commit:
+            self.post_payment(instance)
+        else:
+            save_m2m = self.save_m2m
+
+            def save_related():
+                save_m2m()
+                self.post_payment(instance)
+
+            self.save_m2m = save_related
+        return instance
+
+    @staticmethod
+    def post_payment(instance: Payment):
         student = instance.student
-        student.balance += instance.amount
-        student.save()
+        BalanceEntry.objects.post(student, instance.amount,
+                                  BalanceEntryKind.MANUAL_PAYMENT, payment=instance)
         History.objects.create(
             student=student,
             description=f'Владелец совершил платеж в размере {instance.amount} сом',
             manager=instance.terminal.name,
         )
-        return instance
 
 
 class BookChangeForm(forms.ModelForm):
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db.models import Min
+
+from main.models import History
+from main.models import StudentGroupStatus
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the latest student status per group from History'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of History ids scanned per chunk')
+
+    def handle(self, *args, chunk_size, **options):
+        histories = History.objects.filter(
+            student__isnull=False,
+            group__isnull=False,
+        )
+        bounds = histories.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('History is empty, nothing to rebuild')
+            return
+
+        total = 0
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            chunk = histories.filter(
+                id__gte=start,
+                id__lt=start + chunk_size,
+            ).order_by(
+                'student_id', 'group_id', '-created_at', '-id',
+            ).distinct(
+                'student_id', 'group_id',
+            ).only(
+                'student_id', 'group_id', 'description', 'comment', 'created_at',
+            )
+            total += StudentGroupStatus.objects.record(chunk)
+            self.stdout.write(f'History ids {start}-{start + chunk_size - 1}: '
+                              f'{total} statuses written')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} statuses written'))
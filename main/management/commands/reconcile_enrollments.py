@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import OuterRef
+
+from main.models import Group
+from main.models import Student
+from main.models import StudentGroupEnrollment
+
+
+class Command(BaseCommand):
+    help = 'Recount student group enrollments from lessons and subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of student ids recounted per chunk')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete enrollments of pairs with no lessons '
+                                 'and no subscription')
+
+    def handle(self, *args, chunk_size, prune, **options):
+        bounds = Student.all_objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('There are no students, nothing to reconcile')
+            return
+
+        total = 0
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            total += StudentGroupEnrollment.objects.refresh_students(start, start + chunk_size)
+            self.stdout.write(f'Student ids {start}-{start + chunk_size - 1}: '
+                              f'{total} enrollments written')
+
+        if prune:
+            deleted, _ = StudentGroupEnrollment.objects.filter(
+                ~Exists(Group.students.through.objects.filter(
+                    group_id=OuterRef('group_id'),
+                    student_id=OuterRef('student_id'),
+                )),
+                total_lessons=0,
+            ).delete()
+            self.stdout.write(f'{deleted} stale enrollments deleted')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} enrollments written'))
@@ -0,0 +1,152 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from main.availability import day_pattern
+from main.models import Group
+from main.models import Pending
+
+# Points a group gets for every wish of a pending student it fulfils.
+# A wish left empty (any time, any teacher) is fulfilled by every group.
+DAYS_SCORE = 4
+TIME_SCORE = 3
+TEACHER_SCORE = 2
+LEVEL_SCORE = 1
+
+MATCHING_GENERATION_KEY = 'pending-matching-generation'
+
+# branch id -> (expires at, generation, index)
+_indexes = {}
+
+
+class GroupEntry(NamedTuple):
+    id: int
+    subject_id: int
+    level: Optional[str]
+    days_type: int
+    start_time: int
+    teacher_id: Optional[int]
+    free_places: int
+
+
+class PendingEntry(NamedTuple):
+    id: int
+    subject_id: int
+    level: str
+    days_type: int
+    start_time: Optional[int]
+    teacher_id: Optional[int]
+    created_at: datetime
+
+
+def normalize_level(level) -> str:
+    return (level or '').strip().casefold()
+
+
+def score(pending: PendingEntry, group: GroupEntry) -> int:
+    points = 0
+    if day_pattern(pending.days_type) == day_pattern(group.days_type):
+        points += DAYS_SCORE
+    if pending.start_time is None or pending.start_time == group.start_time:
+        points += TIME_SCORE
+    if pending.teacher_id is None or pending.teacher_id == group.teacher_id:
+        points += TEACHER_SCORE
+    if normalize_level(pending.level) == normalize_level(group.level):
+        points += LEVEL_SCORE
+    return points
+
+
+class MatchingIndex:
+    """
+    Groups with free places and pending students of a branch, bucketed by
+    subject. A question about one pending or one group only scores the
+    other side of its own subject bucket.
+    """
+
+    def __init__(self, groups, pendings):
+        self.groups = {group.id: group for group in groups}
+        self.pendings = {pending.id: pending for pending in pendings}
+        self.groups_by_subject = defaultdict(list)
+        for group in groups:
+            if group.free_places > 0:
+                self.groups_by_subject[group.subject_id].append(group)
+        self.pendings_by_subject = defaultdict(list)
+        for pending in pendings:
+            self.pendings_by_subject[pending.subject_id].append(pending)
+
+    @classmethod
+    def for_branch(cls, branch_id):
+        groups = [GroupEntry(*row) for row in Group.objects.filter(
+            branch_id=branch_id,
+        ).annotate(
+            free_places=F('max_student_count') - F('student_count'),
+        ).values_list(
+            'id', 'subject_id', 'level', 'days_type', 'start_time', 'current_teacher_id',
+            'free_places',
+        )]
+        pendings = [PendingEntry(*row) for row in Pending.objects.filter(
+            student__branch_id=branch_id,
+        ).values_list(
+            'id', 'subject_id', 'level', 'days_type', 'start_time', 'teacher_id',
+            'created_at',
+        )]
+        return cls(groups, pendings)
+
+    def groups_for(self, pending_id, limit=None):
+        """(score, group) pairs for the pending, best and emptiest first."""
+        pending = self.pendings.get(pending_id)
+        if pending is None:
+            return []
+        matches = sorted(
+            ((score(pending, group), group)
+             for group in self.groups_by_subject.get(pending.subject_id, ())),
+            key=lambda match: (-match[0], -match[1].free_places, match[1].id),
+        )
+        return matches[:limit]
+
+    def pendings_for(self, group_id, limit=None):
+        """(score, pending) pairs for the group, best and longest waiting first."""
+        group = self.groups.get(group_id)
+        if group is None or group.free_places <= 0:
+            return []
+        matches = sorted(
+            ((score(pending, group), pending)
+             for pending in self.pendings_by_subject.get(group.subject_id, ())),
+            key=lambda match: (-match[0], match[1].created_at, match[1].id),
+        )
+        return matches[:limit]
+
+
+def _generation():
+    return cache.get_or_set(MATCHING_GENERATION_KEY, 0, None)
+
+
+def matching_index(branch_id) -> MatchingIndex:
+    """
+    Matching index of the branch kept in process memory. It is rebuilt when
+    it expires or when a group or pending has changed in any process.
+    """
+    generation = _generation()
+    cached = _indexes.get(branch_id)
+    if cached and cached[0] > time.monotonic() and cached[1] == generation:
+        return cached[2]
+    index = MatchingIndex.for_branch(branch_id)
+    _indexes[branch_id] = (
+        time.monotonic() + settings.MATCHING_INDEX_TIMEOUT, generation, index,
+    )
+    return index
+
+
+def clear_matching_indexes():
+    """Drop matching indexes in this process and in every worker."""
+    _indexes.clear()
+    try:
+        cache.incr(MATCHING_GENERATION_KEY)
+    except ValueError:
+        cache.set(MATCHING_GENERATION_KEY, 1, None)
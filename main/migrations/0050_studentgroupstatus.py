@@ -0,0 +1,41 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+fill_statuses = '''
+insert into main_studentgroupstatus (student_id, group_id, description, comment, updated_at)
+select distinct on (student_id, group_id) student_id, group_id, description, comment, created_at
+from main_history
+where student_id is not null
+  and group_id is not null
+order by student_id, group_id, created_at desc, id desc;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0049_unsubscribed_group_unsubscribed_unsubscribed_group_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentGroupStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(verbose_name='description')),
+                ('comment', models.TextField(blank=True, null=True, verbose_name='comment')),
+                ('updated_at', models.DateTimeField(verbose_name='updated at')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_statuses', to='main.group')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_statuses', to='main.student')),
+            ],
+            options={
+                'verbose_name': 'student group status',
+                'verbose_name_plural': 'student group statuses',
+                'unique_together': {('group', 'student')},
+            },
+        ),
+        migrations.RunSQL(fill_statuses, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0050_studentgroupstatus'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['completion_timestamp', 'id'], name='main_lesson_complet_be5040_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0051_lesson_completion_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Closure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('reason', models.CharField(max_length=255, verbose_name='reason')),
+                ('branch', models.ForeignKey(blank=True, help_text='Leave empty for a holiday of all branches', null=True, on_delete=django.db.models.deletion.CASCADE, to='main.branch', verbose_name='branch')),
+            ],
+            options={
+                'verbose_name': 'closure',
+                'verbose_name_plural': 'closures',
+                'ordering': ('date',),
+                'unique_together': {('branch', 'date')},
+            },
+        ),
+    ]
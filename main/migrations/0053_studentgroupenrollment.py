@@ -0,0 +1,64 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import main.models.fields
+
+
+fill_enrollments = '''
+insert into main_studentgroupenrollment (student_id, group_id, total_lessons, remaining_lessons,
+                                         remaining_value, next_lesson_at, last_attended_at, updated_at)
+select pairs.student_id, pairs.group_id, count(sl.id),
+       count(sl.id) filter (where l.took_place is not true),
+       coalesce(sum(sl.lesson_price) filter (where not sl.has_participated and l.took_place is not true), 0),
+       min(l.completion_timestamp) filter (where l.took_place is null),
+       max(l.completion_timestamp) filter (where sl.has_participated),
+       now()
+from (select sl.student_id, l.group_id
+      from main_studentlesson sl
+      join main_lesson l on l.id = sl.lesson_id
+      where sl.student_id is not null
+        and l.group_id is not null
+      union
+      select student_id, group_id
+      from main_group_students) as pairs
+left join (main_studentlesson sl join main_lesson l on l.id = sl.lesson_id)
+  on sl.student_id = pairs.student_id and l.group_id = pairs.group_id
+group by pairs.student_id, pairs.group_id;
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0052_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentGroupEnrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_lessons', models.PositiveIntegerField(default=0, verbose_name='total lessons')),
+                ('remaining_lessons', models.PositiveIntegerField(default=0, verbose_name='remaining lessons')),
+                ('remaining_value', main.models.fields.MoneyField(decimal_places=2, default=0, max_digits=22, verbose_name='remaining value')),
+                ('next_lesson_at', models.DateTimeField(blank=True, null=True, verbose_name='next lesson at')),
+                ('last_attended_at', models.DateTimeField(blank=True, null=True, verbose_name='last attended at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='main.group')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='main.student')),
+            ],
+            options={
+                'verbose_name': 'student group enrollment',
+                'verbose_name_plural': 'student group enrollments',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='studentgroupenrollment',
+            index=models.Index(fields=['group', 'remaining_lessons'], name='main_studen_group_i_2f2189_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentgroupenrollment',
+            unique_together={('group', 'student')},
+        ),
+        migrations.RunSQL(fill_enrollments, migrations.RunSQL.noop),
+    ]
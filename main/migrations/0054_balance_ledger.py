@@ -0,0 +1,60 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+opening_entries = '''
+insert into main_balanceentry (student_id, amount, kind, created_at)
+select id, balance, 'opening', now()
+from main_student
+where balance <> 0;
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0053_studentgroupenrollment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=22, verbose_name='amount')),
+                ('kind', models.CharField(choices=[('opening', 'opening balance'), ('terminal_payment', 'terminal payment'), ('manual_payment', 'manual payment'), ('transfer_in', 'transfer in'), ('transfer_out', 'transfer out'), ('lessons', 'lessons'), ('loan', 'loan lesson'), ('refund', 'refund'), ('book', 'book')], max_length=32, verbose_name='kind')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='balance_entries', to='main.payment', verbose_name='payment')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to='main.student', verbose_name='student')),
+            ],
+            options={
+                'verbose_name': 'balance entry',
+                'verbose_name_plural': 'balance entries',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=22, verbose_name='balance')),
+                ('created_at', models.DateTimeField(verbose_name='created at')),
+                ('last_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='main.balanceentry', verbose_name='last entry')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='main.student', verbose_name='student')),
+            ],
+            options={
+                'verbose_name': 'balance snapshot',
+                'verbose_name_plural': 'balance snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['student', 'last_entry'], name='main_balanc_student_c06b28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balanceentry',
+            index=models.Index(fields=['student', 'id'], name='main_balanc_student_9c2ce8_idx'),
+        ),
+        migrations.RunSQL(opening_entries, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0054_balance_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='idempotency key'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='payment',
+            unique_together={('terminal', 'idempotency_key')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:30
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django_better_admin_arrayfield.models.fields
+
+from main.validators import normalize_phone
+
+
+def fill_phone_keys(apps, schema_editor):
+    Student = apps.get_model('main', 'Student')
+    students = []
+    for student in Student.objects.only('id', 'phone', 'phones').iterator(2000):
+        keys = [normalize_phone(phone) for phone in (student.phone, *(student.phones or ()))]
+        student.phone_keys = list(dict.fromkeys(key for key in keys if key))
+        students.append(student)
+    Student.objects.bulk_update(students, ('phone_keys',), 2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0055_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='phone_keys',
+            field=django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.CharField(max_length=32), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone_keys'], name='main_studen_phone_k_5253e9_gin'),
+        ),
+        migrations.RunPython(fill_phone_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:36
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+fill_counts = '''
+update main_group
+set student_count = (select count(*) from main_group_students
+                     where main_group_students.group_id = main_group.id),
+    unsubscribed_count = (select count(*) from main_unsubscribed
+                          where main_unsubscribed.group_id = main_group.id);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0056_student_phone_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='number of students'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='unsubscribed_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='number of unsubscribed students'),
+        ),
+        migrations.RunSQL(fill_counts, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(django.db.models.expressions.F('branch'), django.db.models.expressions.CombinedExpression(django.db.models.expressions.F('max_student_count'), '-', django.db.models.expressions.F('student_count')), name='group_free_places_idx'),
+        ),
+    ]
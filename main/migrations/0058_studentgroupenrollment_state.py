@@ -0,0 +1,40 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+fill_states = '''
+update main_studentgroupenrollment e
+set state = case
+    when exists (select 1 from main_studentlesson sl
+                 join main_lesson l on l.id = sl.lesson_id
+                 where sl.student_id = e.student_id and l.group_id = e.group_id
+                   and sl.plan_id = 1 and l.took_place is not true) then 'trial'
+    when not exists (select 1 from main_group_students m
+                     where m.student_id = e.student_id
+                       and m.group_id = e.group_id) then 'inactive'
+    when e.total_lessons = 0 then 'no_lesson'
+    when e.remaining_lessons = 0 then 'completed'
+    else 'active'
+end;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0057_group_student_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentgroupenrollment',
+            name='state',
+            field=models.CharField(choices=[('trial', 'trial'), ('active', 'active'), ('completed', 'completed'), ('no_lesson', 'no lesson'), ('inactive', 'inactive')], default='inactive', max_length=16, verbose_name='state'),
+        ),
+        migrations.RunSQL(fill_states, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='studentgroupenrollment',
+            index=models.Index(fields=['state', 'group'], name='main_studen_state_16f05d_idx'),
+        ),
+    ]
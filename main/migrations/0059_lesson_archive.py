@@ -0,0 +1,79 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import main.models.fields
+
+
+fill_archived_at = '''
+update main_group
+set archived_at = coalesce(
+    (select max(created_at) from main_history
+     where main_history.group_id = main_group.id
+       and main_history.description = 'Группа архивировано'),
+    now())
+where archived;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0058_studentgroupenrollment_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLesson',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('completion_timestamp', models.DateTimeField()),
+                ('took_place', models.BooleanField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(verbose_name='archived at')),
+            ],
+            options={
+                'verbose_name': 'archived lesson',
+                'verbose_name_plural': 'archived lessons',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='archived at'),
+        ),
+        migrations.RunSQL(fill_archived_at, migrations.RunSQL.noop),
+        migrations.CreateModel(
+            name='ArchivedStudentLesson',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('has_participated', models.BooleanField(default=False, verbose_name='has participated')),
+                ('lesson_price', main.models.fields.MoneyField(decimal_places=2, max_digits=22, verbose_name='lesson price')),
+                ('absence_reason', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.absencereason', verbose_name='absence reason')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_lessons', to='main.archivedlesson', verbose_name='lesson')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='main.plan')),
+                ('student', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.student', verbose_name='student')),
+            ],
+            options={
+                'verbose_name': 'archived student lesson',
+                'verbose_name_plural': 'archived student lessons',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedlesson',
+            name='group',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.group'),
+        ),
+        migrations.AddField(
+            model_name='archivedlesson',
+            name='teacher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='main.teacher'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedstudentlesson',
+            index=models.Index(fields=['student', 'lesson'], name='main_archiv_student_ef80e3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedlesson',
+            index=models.Index(fields=['group', 'completion_timestamp'], name='main_archiv_group_i_49cb3e_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.8 on 2026-10-18 11:52
+
+from django.db import migrations
+
+
+# Cancelled lessons were counted as remaining, recount them as over
+refill_enrollments = '''
+update main_studentgroupenrollment e
+set remaining_lessons = c.remaining_lessons,
+    remaining_value = c.remaining_value,
+    state = case
+        when c.trials > 0 then 'trial'
+        when not exists (select 1 from main_group_students m
+                         where m.student_id = e.student_id
+                           and m.group_id = e.group_id) then 'inactive'
+        when e.total_lessons = 0 then 'no_lesson'
+        when c.remaining_lessons = 0 then 'completed'
+        else 'active'
+    end
+from (select enrollment.id,
+             count(sl.id) filter (where l.took_place is null) as remaining_lessons,
+             coalesce(sum(sl.lesson_price) filter (
+                 where not sl.has_participated and l.took_place is null), 0) as remaining_value,
+             count(sl.id) filter (where sl.plan_id = 1 and l.took_place is null) as trials
+      from main_studentgroupenrollment enrollment
+      left join (main_studentlesson sl join main_lesson l on l.id = sl.lesson_id)
+        on sl.student_id = enrollment.student_id and l.group_id = enrollment.group_id
+      group by enrollment.id) as c
+where c.id = e.id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0059_lesson_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(refill_enrollments, migrations.RunSQL.noop),
+    ]
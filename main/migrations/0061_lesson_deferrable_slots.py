@@ -0,0 +1,26 @@
+# Generated by Django 4.0.8 on 2026-10-18 12:03
+
+from django.db import migrations, models
+import django.db.models.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0060_enrollment_lessons_not_held'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='lesson',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], fields=('group', 'completion_timestamp'), name='lesson_group_timestamp_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], fields=('teacher', 'completion_timestamp'), name='lesson_teacher_timestamp_uniq'),
+        ),
+    ]
@@ -3,17 +3,24 @@ from .organization import Book
 from .organization import Branch
 from .organization import CeleryTask
 from .organization import CeleryTaskset
+from .organization import Closure
 from .organization import Group
 from .organization import Inventory
 from .organization import Lesson
 from .organization import Pending
 from .organization import Plan
+from .organization import StudentGroupEnrollment
 from .organization import StudentLesson
 from .organization import Subject
+from .archive import ArchivedLesson
+from .archive import ArchivedStudentLesson
+from .payments import BalanceEntry
+from .payments import BalanceSnapshot
 from .payments import EarningRate
 from .payments import Payment
 from .payments import Terminal
 from .users import History
+from .users import StudentGroupStatus
 from .users import TeacherHistory
 from .users import MyAnonymousUser
 from .users import Student
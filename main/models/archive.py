@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from main.models.fields import MoneyField
+from main.models.managers import ArchivedLessonManager
+
+
+class ArchivedLesson(models.Model):
+    """
+    Lesson of a group archived long ago, moved out of the lesson table by
+    the 'archive lessons' task. It keeps the id it had as a Lesson.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    group = models.ForeignKey('Group', models.SET_NULL, null=True)
+    teacher = models.ForeignKey('Teacher', models.RESTRICT)
+    completion_timestamp = models.DateTimeField()
+    took_place = models.BooleanField(null=True, blank=True)
+    archived_at = models.DateTimeField(_('archived at'))
+
+    objects = ArchivedLessonManager()
+
+    class Meta:
+        verbose_name = _('archived lesson')
+        verbose_name_plural = _('archived lessons')
+        indexes = (
+            models.Index(fields=('group', 'completion_timestamp')),
+        )
+
+
+class ArchivedStudentLesson(models.Model):
+    """StudentLesson of an ArchivedLesson, it keeps its id as well."""
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey('Student', models.SET_NULL, null=True,
+                                verbose_name=_('student'))
+    lesson = models.ForeignKey(ArchivedLesson, models.CASCADE, 'student_lessons',
+                               verbose_name=_('lesson'))
+    plan = models.ForeignKey('Plan', models.RESTRICT)
+    has_participated = models.BooleanField(_('has participated'), default=False)
+    absence_reason = models.ForeignKey('AbsenceReason', models.SET_NULL, null=True,
+                                       blank=True, verbose_name=_('absence reason'))
+    lesson_price = MoneyField(_('lesson price'), max_digits=22)
+
+    class Meta:
+        verbose_name = _('archived student lesson')
+        verbose_name_plural = _('archived student lessons')
+        indexes = (
+            models.Index(fields=('student', 'lesson')),
+        )
@@ -1,10 +1,25 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import connections
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
 from django.db.models import Manager
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 from main.choices import (
+    EnrollmentState,
+    Plan,
     Role,
 )
+from main.validators import normalize_phone
 
 
 class UserManager(BaseUserManager):
@@ -50,7 +65,417 @@ class StudentManager(Manager):
     def get_queryset(self):
         return super(StudentManager, self).get_queryset().filter(blacklist=False)
 
+    def by_phone(self, phone):
+        """
+        Student known by the number as the main phone or one of the extra
+        phones, in any format. When several students share the number, the
+        one having it as the main phone wins, otherwise the lookup is
+        ambiguous and MultipleObjectsReturned is raised.
+        """
+        key = normalize_phone(phone)
+        students = list(self.filter(phone_keys__contains=[key])[:10])
+        if not students:
+            raise self.model.DoesNotExist
+        student = self._pick_by_phone(key, students)
+        if student is None:
+            raise self.model.MultipleObjectsReturned
+        return student
+
+    def by_phones(self, phones):
+        """
+        Same as by_phone for many numbers with one query. Returns students
+        keyed by the given numbers, unknown ones are left out and ambiguous
+        ones map to None.
+        """
+        keys = {phone: normalize_phone(phone) for phone in phones}
+        candidates = defaultdict(list)
+        for student in self.filter(phone_keys__overlap=list(set(keys.values()))):
+            for key in student.phone_keys:
+                candidates[key].append(student)
+        result = {}
+        for phone, key in keys.items():
+            if key in candidates:
+                result[phone] = self._pick_by_phone(key, candidates[key])
+        return result
+
+    @staticmethod
+    def _pick_by_phone(key, students):
+        if len(students) == 1:
+            return students[0]
+        owners = [student for student in students if normalize_phone(student.phone) == key]
+        return owners[0] if len(owners) == 1 else None
+
+
+def _member_count(through):
+    return Coalesce(Subquery(
+        through.objects.filter(
+            group_id=OuterRef('pk'),
+        ).values('group_id').annotate(count=Count('id')).values('count'),
+    ), 0)
+
 
 class GroupManager(Manager):
     def get_queryset(self):
         return super().get_queryset().filter(archived=False)
+
+    def refresh_counts(self, group_ids=None):
+        """
+        Recount students and unsubscribed students of the given groups, of
+        every group when no ids are given. Only stale rows are written.
+        """
+        groups = self.model._base_manager.using(self.db)
+        if group_ids is not None:
+            groups = groups.filter(pk__in=list(group_ids))
+        students = _member_count(self.model.students.through)
+        unsubscribed = _member_count(self.model.unsubscribed.through)
+        return groups.alias(
+            actual_students=students,
+            actual_unsubscribed=unsubscribed,
+        ).filter(
+            ~Q(student_count=F('actual_students'))
+            | ~Q(unsubscribed_count=F('actual_unsubscribed')),
+        ).update(student_count=students, unsubscribed_count=unsubscribed)
+
+
+class StudentGroupStatusManager(Manager):
+    def record(self, histories):
+        """
+        Upsert the latest status of every (student, group) pair found in the
+        given History entries. Older entries never overwrite newer ones.
+        """
+        latest = {}
+        for history in histories:
+            if history.student_id is None or history.group_id is None:
+                continue
+            key = history.student_id, history.group_id
+            if key not in latest or latest[key].created_at <= history.created_at:
+                latest[key] = history
+        if not latest:
+            return 0
+
+        table = self.model._meta.db_table
+        params = []
+        for history in latest.values():
+            params.extend((history.student_id, history.group_id, history.description,
+                           history.comment, history.created_at))
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(latest))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(student_id, group_id, description, comment, updated_at) '
+                f'VALUES {values} '
+                f'ON CONFLICT (group_id, student_id) DO UPDATE SET '
+                f'description = EXCLUDED.description, '
+                f'comment = EXCLUDED.comment, '
+                f'updated_at = EXCLUDED.updated_at '
+                f'WHERE {table}.updated_at <= EXCLUDED.updated_at',
+                params,
+            )
+        return len(latest)
+
+
+
+# Lessons with took_place NULL are the ones still to come, cancelled ones
+# (False) are over just like the held ones.
+ENROLLMENT_STATE_SQL = (
+    "CASE "
+    "WHEN count(sl.id) FILTER ("
+    f"WHERE sl.plan_id = {Plan.TRIAL} AND l.took_place IS NULL) > 0 "
+    f"THEN '{EnrollmentState.TRIAL}' "
+    "WHEN NOT EXISTS (SELECT 1 FROM main_group_students m "
+    "WHERE m.student_id = pairs.student_id AND m.group_id = pairs.group_id) "
+    f"THEN '{EnrollmentState.INACTIVE}' "
+    f"WHEN count(sl.id) = 0 THEN '{EnrollmentState.NO_LESSON}' "
+    "WHEN count(sl.id) FILTER (WHERE l.took_place IS NULL) = 0 "
+    f"THEN '{EnrollmentState.COMPLETED}' "
+    f"ELSE '{EnrollmentState.ACTIVE}' END"
+)
+
+
+class StudentGroupEnrollmentManager(Manager):
+    def refresh(self, pairs):
+        """
+        Recount enrollments of the given (student id, group id) pairs with one
+        INSERT ... SELECT ... ON CONFLICT statement. Pairs without lessons
+        get zero counters, so current members are always present. The state
+        is derived from the same counters and the group membership.
+        """
+        pairs = {(student_id, group_id) for student_id, group_id in pairs
+                 if student_id is not None and group_id is not None}
+        if not pairs:
+            return 0
+        params = [value for pair in pairs for value in pair]
+        values = ', '.join(['(%s, %s)'] * len(pairs))
+        return self._upsert(
+            f'SELECT * FROM (VALUES {values}) AS pairs (student_id, group_id)',
+            params,
+        )
+
+    def refresh_lessons(self, lesson_ids):
+        """Recount enrollments of every student of the given lessons."""
+        lesson_ids = list(lesson_ids)
+        if not lesson_ids:
+            return 0
+        return self._upsert(
+            'SELECT DISTINCT sl.student_id, l.group_id '
+            'FROM main_studentlesson sl '
+            'JOIN main_lesson l ON l.id = sl.lesson_id '
+            'WHERE sl.lesson_id = ANY(%s) '
+            'AND sl.student_id IS NOT NULL AND l.group_id IS NOT NULL',
+            [lesson_ids],
+        )
+
+    def refresh_students(self, start, stop):
+        """
+        Recount enrollments of students with ids in [start, stop): every group
+        they have lessons in or are subscribed to.
+        """
+        return self._upsert(
+            'SELECT sl.student_id, l.group_id '
+            'FROM main_studentlesson sl '
+            'JOIN main_lesson l ON l.id = sl.lesson_id '
+            'WHERE sl.student_id >= %s AND sl.student_id < %s '
+            'AND l.group_id IS NOT NULL '
+            'UNION '
+            'SELECT student_id, group_id FROM main_group_students '
+            'WHERE student_id >= %s AND student_id < %s',
+            [start, stop, start, stop],
+        )
+
+    def _upsert(self, pairs_sql, params):
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (student_id, group_id, total_lessons, '
+                f'remaining_lessons, remaining_value, next_lesson_at, '
+                f'last_attended_at, state, updated_at) '
+                f'SELECT pairs.student_id, pairs.group_id, count(sl.id), '
+                f'count(sl.id) FILTER (WHERE l.took_place IS NULL), '
+                f'coalesce(sum(sl.lesson_price) FILTER ('
+                f'WHERE NOT sl.has_participated AND l.took_place IS NULL), 0), '
+                f'min(l.completion_timestamp) FILTER (WHERE l.took_place IS NULL), '
+                f'max(l.completion_timestamp) FILTER (WHERE sl.has_participated), '
+                f'{ENROLLMENT_STATE_SQL}, '
+                f'now() '
+                f'FROM ({pairs_sql}) AS pairs '
+                f'LEFT JOIN (main_studentlesson sl JOIN main_lesson l ON l.id = sl.lesson_id) '
+                f'ON sl.student_id = pairs.student_id AND l.group_id = pairs.group_id '
+                f'GROUP BY pairs.student_id, pairs.group_id '
+                f'ON CONFLICT (group_id, student_id) DO UPDATE SET '
+                f'total_lessons = EXCLUDED.total_lessons, '
+                f'remaining_lessons = EXCLUDED.remaining_lessons, '
+                f'remaining_value = EXCLUDED.remaining_value, '
+                f'next_lesson_at = EXCLUDED.next_lesson_at, '
+                f'last_attended_at = EXCLUDED.last_attended_at, '
+                f'state = EXCLUDED.state, '
+                f'updated_at = EXCLUDED.updated_at',
+                params,
+            )
+            return cursor.rowcount
+
+
+class LessonManager(Manager):
+    def ensure_slots(self, group, timestamps):
+        """
+        Return lessons of the group keyed by completion timestamp, creating the
+        missing ones with a single INSERT. Timestamps taken by another lesson
+        of the teacher are left out.
+        """
+        lessons = self.ensure_many({group: timestamps})
+        return {timestamp: lesson for (_, timestamp), lesson in lessons.items()}
+
+    def ensure_many(self, slots):
+        """
+        Same as ensure_slots for many groups at once, `slots` maps a group to
+        its timestamps. Lessons are keyed by (group id, timestamp).
+        """
+        slots = {group: list(timestamps) for group, timestamps in slots.items()}
+        self.insert_free([
+            self.model(
+                group=group,
+                teacher_id=group.current_teacher_id,
+                completion_timestamp=timestamp,
+            )
+            for group, timestamps in slots.items()
+            for timestamp in timestamps
+        ])
+        wanted = {
+            (group.id, timestamp)
+            for group, timestamps in slots.items()
+            for timestamp in timestamps
+        }
+        lessons = self.filter(
+            group__in=list(slots),
+            completion_timestamp__in={timestamp for _, timestamp in wanted},
+        )
+        return {
+            (lesson.group_id, lesson.completion_timestamp): lesson
+            for lesson in lessons
+            if (lesson.group_id, lesson.completion_timestamp) in wanted
+        }
+
+    def insert_free(self, lessons, batch_size=None):
+        """
+        Insert the lessons whose group and teacher slots are both free and
+        skip the rest. PostgreSQL does not take ON CONFLICT DO NOTHING with
+        the deferrable slot constraints, so the groups and teachers are
+        locked first and concurrent inserts wait instead of conflicting.
+        """
+        if not lessons:
+            return []
+        group_ids = sorted({lesson.group_id for lesson in lessons})
+        teacher_ids = sorted({lesson.teacher_id for lesson in lessons})
+        groups = self.model._meta.get_field('group').related_model._base_manager
+        teachers = self.model._meta.get_field('teacher').related_model._base_manager
+        with transaction.atomic(self.db):
+            list(groups.select_for_update(no_key=True).filter(id__in=group_ids)
+                 .order_by('id').values_list('id'))
+            list(teachers.select_for_update(no_key=True).filter(id__in=teacher_ids)
+                 .order_by('id').values_list('id'))
+            taken = set()
+            for group_id, teacher_id, timestamp in self.filter(
+                Q(group_id__in=group_ids) | Q(teacher_id__in=teacher_ids),
+                completion_timestamp__in={lesson.completion_timestamp for lesson in lessons},
+            ).values_list('group_id', 'teacher_id', 'completion_timestamp'):
+                taken.update((('group', group_id, timestamp), ('teacher', teacher_id, timestamp)))
+            free = []
+            for lesson in lessons:
+                slots = (('group', lesson.group_id, lesson.completion_timestamp),
+                         ('teacher', lesson.teacher_id, lesson.completion_timestamp))
+                if taken.isdisjoint(slots):
+                    taken.update(slots)
+                    free.append(lesson)
+            return self.bulk_create(free, batch_size)
+
+    def move(self, timestamps):
+        """
+        Set completion timestamps of many lessons with one set-based UPDATE,
+        `timestamps` maps lesson id to its new timestamp. The unique
+        constraints on lesson slots are deferred for the UPDATE, so lessons
+        may swap slots with each other, and checked again right after it.
+        """
+        if not timestamps:
+            return 0
+        table = self.model._meta.db_table
+        constraints = ', '.join(constraint.name for constraint in self.model._meta.constraints
+                                if constraint.deferrable)
+        params = []
+        for lesson_id, timestamp in timestamps.items():
+            params.extend((lesson_id, timestamp))
+        values = ', '.join(['(%s, %s::timestamptz)'] * len(timestamps))
+        with transaction.atomic(self.db), connections[self.db].cursor() as cursor:
+            cursor.execute(f'SET CONSTRAINTS {constraints} DEFERRED')
+            cursor.execute(
+                f'UPDATE {table} SET completion_timestamp = moved.timestamp '
+                f'FROM (VALUES {values}) AS moved (id, timestamp) '
+                f'WHERE {table}.id = moved.id',
+                params,
+            )
+            moved = cursor.rowcount
+            cursor.execute(f'SET CONSTRAINTS {constraints} IMMEDIATE')
+            return moved
+
+
+class BalanceEntryManager(Manager):
+    def post(self, student, amount, kind, **kwargs):
+        """Write one ledger entry and apply it to the student's balance."""
+        entry, = self.post_many([self.model(student=student, amount=amount,
+                                            kind=kind, **kwargs)])
+        return entry
+
+    def post_many(self, entries):
+        """
+        Insert ledger entries and apply them to balances with one
+        `balance = balance + delta` UPDATE, so concurrent writers never
+        overwrite each other. New balances are set on the loaded students.
+        """
+        entries = self.bulk_create(entries)
+        deltas = defaultdict(Decimal)
+        for entry in entries:
+            deltas[entry.student_id] += Decimal(entry.amount)
+        if not deltas:
+            return entries
+
+        table = self.model._meta.get_field('student').related_model._meta.db_table
+        params = [value for pair in deltas.items() for value in pair]
+        values = ', '.join(['(%s, %s::numeric)'] * len(deltas))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET balance = {table}.balance + deltas.amount '
+                f'FROM (VALUES {values}) AS deltas (id, amount) '
+                f'WHERE {table}.id = deltas.id '
+                f'RETURNING {table}.id, {table}.balance',
+                params,
+            )
+            balances = dict(cursor.fetchall())
+        for entry in entries:
+            if self.model.student.is_cached(entry):
+                entry.student.balance = balances[entry.student_id]
+        return entries
+
+    def balance_at(self, student_id, moment):
+        """
+        Balance of the student at the given moment: the latest snapshot
+        taken before it plus the entries written after the snapshot.
+        """
+        snapshots = self.model._meta.get_field('snapshots').related_model.objects
+        snapshot = snapshots.filter(
+            student_id=student_id,
+            created_at__lte=moment,
+        ).order_by('-last_entry_id').first()
+        entries = self.filter(student_id=student_id, created_at__lte=moment)
+        if snapshot is not None:
+            entries = entries.filter(id__gt=snapshot.last_entry_id)
+        total = entries.aggregate(total=Sum('amount'))['total'] or Decimal()
+        return total + (snapshot.balance if snapshot is not None else 0)
+
+
+ARCHIVE_LESSONS_SQL = """
+WITH lessons AS (
+    SELECT l.id FROM main_lesson l
+    JOIN main_group g ON g.id = l.group_id
+    WHERE g.archived AND g.archived_at < %s
+    ORDER BY l.id
+    LIMIT %s
+    FOR UPDATE OF l SKIP LOCKED
+), student_lessons AS (
+    DELETE FROM main_studentlesson sl USING lessons
+    WHERE sl.lesson_id = lessons.id
+    RETURNING sl.id, sl.student_id, sl.lesson_id, sl.plan_id,
+              sl.has_participated, sl.absence_reason_id, sl.lesson_price
+), moved_lessons AS (
+    DELETE FROM main_lesson l USING lessons
+    WHERE l.id = lessons.id
+    RETURNING l.id, l.group_id, l.teacher_id, l.completion_timestamp, l.took_place
+), archived_lessons AS (
+    INSERT INTO main_archivedlesson
+        (id, group_id, teacher_id, completion_timestamp, took_place, archived_at)
+    SELECT moved_lessons.*, now() FROM moved_lessons
+    RETURNING id
+), archived_student_lessons AS (
+    INSERT INTO main_archivedstudentlesson
+        (id, student_id, lesson_id, plan_id, has_participated,
+         absence_reason_id, lesson_price)
+    SELECT * FROM student_lessons
+    RETURNING id
+)
+SELECT (SELECT count(*) FROM archived_lessons),
+       (SELECT count(*) FROM archived_student_lessons),
+       (SELECT array_agg(DISTINCT ARRAY[sl.student_id, l.group_id])
+        FROM student_lessons sl JOIN moved_lessons l ON l.id = sl.lesson_id
+        WHERE sl.student_id IS NOT NULL AND l.group_id IS NOT NULL)
+"""
+
+
+class ArchivedLessonManager(Manager):
+    def archive(self, archived_before, limit):
+        """
+        Move up to `limit` lessons of groups archived before the given time,
+        with their student lessons, into the archive tables in one
+        statement. Return the number of moved lessons and student lessons
+        and the (student id, group id) pairs they belonged to.
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(ARCHIVE_LESSONS_SQL, [archived_before, limit])
+            lessons, student_lessons, pairs = cursor.fetchone()
+        return lessons, student_lessons, [tuple(pair) for pair in pairs or ()]
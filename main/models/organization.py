@@ -1,12 +1,17 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F
 from django.db.models import Manager
 from django.utils.translation import gettext_lazy as _
 
 from main.choices import Day
+from main.choices import EnrollmentState
 from main.choices import TaskStatus
 from main.choices import Time
 from main.models.fields import MoneyField
 from main.models.managers import GroupManager
+from main.models.managers import LessonManager
+from main.models.managers import StudentGroupEnrollmentManager
 
 
 class Branch(models.Model):
@@ -21,6 +26,23 @@ class Branch(models.Model):
         return self.name
 
 
+class Closure(models.Model):
+    branch = models.ForeignKey(Branch, models.CASCADE, null=True, blank=True,
+                               verbose_name=_('branch'),
+                               help_text=_('Leave empty for a holiday of all branches'))
+    date = models.DateField(_('date'))
+    reason = models.CharField(_('reason'), max_length=255)
+
+    class Meta:
+        verbose_name = _('closure')
+        verbose_name_plural = _('closures')
+        ordering = ('date',)
+        unique_together = ('branch', 'date')
+
+    def __str__(self):
+        return f'{self.date} {self.reason}'
+
+
 class Inventory(models.Model):
     name = models.CharField(_('name'), max_length=500)
     branch = models.ForeignKey(Branch, models.SET_NULL, null=True,
@@ -111,7 +133,13 @@ class Group(models.Model):
     comment = models.TextField(_('comment'), null=True, blank=True)
     book = models.ForeignKey('Book', models.SET_NULL, null=True, blank=True)
     archived = models.BooleanField(_('is archived'), default=False)
+    archived_at = models.DateTimeField(_('archived at'), null=True, blank=True)
     started_at = models.DateTimeField(_('started at'), null=True, auto_now_add=True)
+    # kept up to date from membership changes, see GroupManager.refresh_counts
+    student_count = models.PositiveIntegerField(_('number of students'), default=0,
+                                                editable=False)
+    unsubscribed_count = models.PositiveIntegerField(_('number of unsubscribed students'),
+                                                     default=0, editable=False)
 
     objects = GroupManager()
     all_objects = Manager()
@@ -137,10 +165,22 @@ class Group(models.Model):
         verbose_name_plural = _('groups')
         ordering = ('start_time', )
         unique_together = ('days_type', 'start_time', 'current_teacher', 'archived')
+        indexes = [
+            models.Index('branch', F('max_student_count') - F('student_count'),
+                         name='group_free_places_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} {Day(self.days_type).label} {Time(self.start_time).label}'
 
+    def clean(self):
+        # Lessons moved by the 'archive lessons' task are not moved back
+        if not self.archived and self.pk and self.archivedlesson_set.exists():
+            raise ValidationError({'archived': _(
+                'Lessons of this group are moved to the archive, it can not be '
+                'unarchived'
+            )})
+
 
 class Pending(models.Model):
     student = models.ForeignKey('Student', models.CASCADE,
@@ -167,12 +207,25 @@ class Lesson(models.Model):
     completion_timestamp = models.DateTimeField()
     took_place = models.BooleanField(null=True, blank=True)
 
+    objects = LessonManager()
+
     class Meta:
         verbose_name = _('lesson')
         verbose_name_plural = _('lessons')
-        unique_together = (
-            ('group', 'completion_timestamp'),
-            ('teacher', 'completion_timestamp'),
+        constraints = (
+            models.UniqueConstraint(
+                fields=('group', 'completion_timestamp'),
+                name='lesson_group_timestamp_uniq',
+                deferrable=models.Deferrable.IMMEDIATE,
+            ),
+            models.UniqueConstraint(
+                fields=('teacher', 'completion_timestamp'),
+                name='lesson_teacher_timestamp_uniq',
+                deferrable=models.Deferrable.IMMEDIATE,
+            ),
+        )
+        indexes = (
+            models.Index(fields=('completion_timestamp', 'id')),
         )
 
     def __str__(self):
@@ -217,6 +270,42 @@ class StudentLesson(models.Model):
         # )
 
 
+
+class StudentGroupEnrollment(models.Model):
+    """
+    Lesson counters of a student inside a group. It is a read model kept in
+    sync with StudentLesson and Lesson, remaining lessons are the ones not
+    taken place yet and remaining value is what unsubscribing gives back.
+    State tells which list of the group the student belongs to, a trial
+    lesson not held yet (took_place is null) wins over membership.
+    """
+    student = models.ForeignKey('Student', models.CASCADE, 'enrollments')
+    group = models.ForeignKey(Group, models.CASCADE, 'enrollments')
+    total_lessons = models.PositiveIntegerField(_('total lessons'), default=0)
+    remaining_lessons = models.PositiveIntegerField(_('remaining lessons'), default=0)
+    remaining_value = MoneyField(_('remaining value'), max_digits=22, default=0)
+    next_lesson_at = models.DateTimeField(_('next lesson at'), null=True, blank=True)
+    last_attended_at = models.DateTimeField(_('last attended at'), null=True, blank=True)
+    state = models.CharField(_('state'), max_length=16, choices=EnrollmentState.choices,
+                             default=EnrollmentState.INACTIVE)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    objects = StudentGroupEnrollmentManager()
+
+    class Meta:
+        verbose_name = _('student group enrollment')
+        verbose_name_plural = _('student group enrollments')
+        unique_together = ('group', 'student')
+        indexes = (
+            models.Index(fields=('group', 'remaining_lessons')),
+            models.Index(fields=('state', 'group')),
+        )
+
+    @property
+    def is_completed(self) -> bool:
+        return self.total_lessons > 0 and self.remaining_lessons == 0
+
+
 class CeleryTask(models.Model):
     id = models.IntegerField(primary_key=True)
     task_id = models.CharField(_('task id'), unique=True, max_length=155,
@@ -1,8 +1,10 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from main.choices import BalanceEntryKind
 from main.models import Group
 from main.models.fields import MoneyField
+from main.models.managers import BalanceEntryManager
 
 
 class Terminal(models.Model):
@@ -23,10 +25,13 @@ class Payment(models.Model):
     terminal = models.ForeignKey(Terminal, models.SET_NULL, null=True)
     student = models.ForeignKey('Student', models.SET_NULL, null=True)
     created = models.DateTimeField(_('created'), auto_now_add=True)
+    idempotency_key = models.CharField(_('idempotency key'), max_length=64,
+                                       null=True, blank=True)
 
     class Meta:
         verbose_name = _('payment')
         verbose_name_plural = _('payments')
+        unique_together = ('terminal', 'idempotency_key')
 
 
 class EarningRate(models.Model):
@@ -37,3 +42,48 @@ class EarningRate(models.Model):
     class Meta:
         verbose_name = _('earning rate')
         verbose_name_plural = _('earning rates')
+
+
+class BalanceEntry(models.Model):
+    """
+    Append-only record of a student balance change. Student.balance is the
+    sum of all entries of the student and is only changed through
+    BalanceEntry.objects.post and post_many.
+    """
+    student = models.ForeignKey('Student', models.CASCADE, 'balance_entries',
+                                verbose_name=_('student'))
+    amount = models.DecimalField(_('amount'), max_digits=22, decimal_places=2)
+    kind = models.CharField(_('kind'), max_length=32, choices=BalanceEntryKind.choices)
+    payment = models.ForeignKey(Payment, models.SET_NULL, 'balance_entries',
+                                null=True, blank=True, verbose_name=_('payment'))
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+
+    objects = BalanceEntryManager()
+
+    class Meta:
+        verbose_name = _('balance entry')
+        verbose_name_plural = _('balance entries')
+        ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('student', 'id')),
+        )
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.amount}'
+
+
+class BalanceSnapshot(models.Model):
+    """Balance of a student after all entries up to `last_entry`."""
+    student = models.ForeignKey('Student', models.CASCADE, 'balance_snapshots',
+                                verbose_name=_('student'))
+    balance = models.DecimalField(_('balance'), max_digits=22, decimal_places=2)
+    last_entry = models.ForeignKey(BalanceEntry, models.CASCADE, 'snapshots',
+                                   verbose_name=_('last entry'))
+    created_at = models.DateTimeField(_('created at'))
+
+    class Meta:
+        verbose_name = _('balance snapshot')
+        verbose_name_plural = _('balance snapshots')
+        indexes = (
+            models.Index(fields=('student', 'last_entry')),
+        )
@@ -1,19 +1,40 @@
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.models import Group as AuthGroup
 from django.contrib.auth.models import PermissionsMixin
-from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 from django_better_admin_arrayfield.models.fields import ArrayField
 
 from main.choices import Promoter
 from main.choices import Role
 from main.models.fields import MoneyField
-from main.models.managers import UserManager
+from main.models.managers import StudentGroupStatusManager
 from main.models.managers import StudentManager
+from main.models.managers import UserManager
+from main.validators import normalize_phone
 from main.validators import phone_regex_kg
 
 
+# auth Group id of every role, filled lazily per process
+_role_groups = {}
+
+
+def role_group_id(role: str) -> int:
+    if role in _role_groups:
+        return _role_groups[role]
+    group, _ = AuthGroup.objects.get_or_create(name=role)
+    # a group created by a transaction that is rolled back must not be cached
+    transaction.on_commit(lambda: _role_groups.setdefault(role, group.pk))
+    return group.pk
+
+
+def clear_role_groups():
+    _role_groups.clear()
+
+
 class MyAnonymousUser(AnonymousUser):
     branch_id = -1
 
@@ -58,24 +79,34 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = _('user')
         verbose_name_plural = _('users')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_role = user.__dict__.get('role')
+        return user
+
     def save(self, *args, **kwargs):
-        try:
-            group_model = ContentType.objects.get(
-                app_label='auth', model='group').model_class()
-            try:
-                self.groups.clear()
-                group, created = group_model.objects.get_or_create(name=self.role)
-                self.groups.add(group)
-                self.is_staff = True
-            except group_model.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-        except ContentType.DoesNotExist:
-            pass
+        """
+        Keep the user in the auth group of their role. The groups are only
+        touched when the role has changed since the user was loaded.
+        """
+        update_fields = kwargs.get('update_fields')
+        sync_role = (
+            self.role
+            and (update_fields is None or 'role' in update_fields)
+            and (self._state.adding or self.role != getattr(self, '_loaded_role', None))
+        )
+        if sync_role:
+            self.is_staff = True
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'is_staff'}
 
         super(User, self).save(*args, **kwargs)
 
+        if sync_role:
+            self.groups.set([role_group_id(self.role)])
+            self._loaded_role = self.role
+
     def __str__(self):
         return f'{self.phone}-{self.fullname}'
 
@@ -112,6 +143,9 @@ class Student(models.Model):
     blacklist = models.BooleanField(_('blacklist'), default=False)
     phones = ArrayField(models.CharField(max_length=12, validators=[phone_regex_kg]),
                         verbose_name=_('phones'), null=True, blank=True)
+    # normalized phone and phones, see StudentManager.by_phone
+    phone_keys = ArrayField(models.CharField(max_length=32), default=list,
+                            blank=True, editable=False)
 
     # management stuff
     curator = models.ForeignKey(User, models.SET_NULL, null=True,
@@ -129,10 +163,43 @@ class Student(models.Model):
             ('manage_students_in_same_branch', _('Manage students in the same branch')),
         )
         ordering = ('last_name', 'first_name')
+        indexes = (
+            GinIndex(fields=('phone_keys',)),
+        )
 
     def __str__(self):
         return f'{self.phone}-{self.fullname}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        student = super().from_db(db, field_names, values)
+        student._loaded_name = student.get_name()
+        return student
+
+    def get_name(self) -> tuple:
+        """Loaded name fields, compared to tell whether the student was renamed."""
+        return tuple(
+            self.__dict__.get(field) for field in ('first_name', 'middle_name', 'last_name')
+        )
+
+    def save(self, *args, **kwargs):
+        self.phone_keys = self.get_phone_keys()
+        update_fields = kwargs.get('update_fields')
+        # The balance belongs to the BalanceEntry ledger, a full save of a
+        # stale instance must not overwrite it.
+        if not self._state.adding and update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'balance'
+            ]
+        elif update_fields is not None and {'phone', 'phones'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'phone_keys'}
+        super().save(*args, **kwargs)
+
+    def get_phone_keys(self) -> list[str]:
+        keys = [normalize_phone(phone) for phone in (self.phone, *(self.phones or ()))]
+        return list(dict.fromkeys(key for key in keys if key))
+
     @property
     def fullname(self):
         return f'{self.last_name} {self.first_name} {self.middle_name or ""}'.strip()
@@ -161,6 +228,28 @@ class History(models.Model):
         return self.description
 
 
+class StudentGroupStatus(models.Model):
+    """
+    Latest History entry of a student inside a group. It is a read model kept
+    in sync with History so lists can join it instead of scanning History.
+    """
+    student = models.ForeignKey('Student', models.CASCADE, 'group_statuses')
+    group = models.ForeignKey('Group', models.CASCADE, 'student_statuses')
+    description = models.TextField(_('description'))
+    comment = models.TextField(_('comment'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('updated at'))
+
+    objects = StudentGroupStatusManager()
+
+    class Meta:
+        verbose_name = _('student group status')
+        verbose_name_plural = _('student group statuses')
+        unique_together = ('group', 'student')
+
+    def __str__(self):
+        return self.description
+
+
 class TeacherHistory(models.Model):
     teacher = models.ForeignKey('Teacher', models.CASCADE, 'histories')
     manager = models.CharField(_('actor'), max_length=255)
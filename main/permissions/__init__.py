@@ -1,4 +1,8 @@
+import time
+
 import jwt
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
 
 from main.models import (
@@ -15,7 +19,7 @@ from ..choices import Role
 
 class HasBranch(BasePermission):
     def has_permission(self, request, view):
-        if request.user.branch:
+        if request.user.branch_id:
             return True
         raise BranchNotFound
 
@@ -25,28 +29,66 @@ class IsManager(BasePermission):
         return request.user.is_superuser or request.user.role == Role.MANAGER
 
 
+TERMINAL_GENERATION_KEY = 'terminal-auth-generation'
+TERMINAL_CACHE_MAX_SIZE = 1024
+
+# token -> (expires at, generation, terminal)
+_terminals = {}
+
+
+def _terminal_generation():
+    return cache.get_or_set(TERMINAL_GENERATION_KEY, 0, None)
+
+
+def clear_terminal_cache():
+    """Forget verified terminal tokens in this process and in every worker."""
+    _terminals.clear()
+    try:
+        cache.incr(TERMINAL_GENERATION_KEY)
+    except ValueError:
+        cache.set(TERMINAL_GENERATION_KEY, 1, None)
+
+
 class IsTerminalAuthenticated(BasePermission):
+    """
+    Verified tokens are kept in process memory for a short time together
+    with the terminal, so steady state requests do not touch the database.
+    Terminal changes bump a shared generation which drops them everywhere.
+    """
 
     def has_permission(self, request, view):
-        if token := request.headers.get('Terminal-Authorization'):
-            try:
-                unverified_payload = jwt.decode(token, options={'verify_signature': False})
-                if 'id' in unverified_payload:
-                    try:
-                        terminal = Terminal.objects.get(id=unverified_payload['id'])
-                        try:
-                            jwt.decode(token, str(terminal.access_token), 'HS256')
-                            setattr(request, 'terminal', terminal)
-                            return True
-                        except jwt.exceptions.InvalidSignatureError:
-                            raise InvalidTokenProvided
-                        except jwt.exceptions.PyJWTError:
-                            raise InvalidTokenProvided
-                        except jwt.exceptions.DecodeError:
-                            raise InvalidTokenFormat
-                    except Terminal.DoesNotExist:
-                        raise InvalidTokenProvided
-                raise InvalidTokenProvided
-            except jwt.exceptions.DecodeError:
-                raise InvalidTokenFormat
-        raise TokenNotProvided
+        token = request.headers.get('Terminal-Authorization')
+        if not token:
+            raise TokenNotProvided
+        generation = _terminal_generation()
+        cached = _terminals.get(token)
+        if cached and cached[0] > time.monotonic() and cached[1] == generation:
+            setattr(request, 'terminal', cached[2])
+            return True
+
+        terminal = self.verify(token)
+        if len(_terminals) >= TERMINAL_CACHE_MAX_SIZE:
+            _terminals.clear()
+        _terminals[token] = (
+            time.monotonic() + settings.TERMINAL_AUTH_CACHE_TIMEOUT, generation, terminal,
+        )
+        setattr(request, 'terminal', terminal)
+        return True
+
+    @staticmethod
+    def verify(token) -> Terminal:
+        try:
+            unverified_payload = jwt.decode(token, options={'verify_signature': False})
+        except jwt.exceptions.DecodeError:
+            raise InvalidTokenFormat
+        if 'id' not in unverified_payload:
+            raise InvalidTokenProvided
+        try:
+            terminal = Terminal.objects.get(id=unverified_payload['id'])
+        except Terminal.DoesNotExist:
+            raise InvalidTokenProvided
+        try:
+            jwt.decode(token, str(terminal.access_token), 'HS256')
+        except jwt.exceptions.PyJWTError:
+            raise InvalidTokenProvided
+        return terminal
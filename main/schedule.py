@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.timezone import localdate
+
+from main.models import Closure
+
+CLOSURES_CACHE_TIMEOUT = 60
+CLOSURES_GENERATION_KEY = 'closed-dates-generation'
+
+# branch id -> (expires at, generation, dates)
+_closures = {}
+
+
+def _week_offsets(start, weekdays):
+    return sorted((weekday - start.weekday()) % 7 for weekday in set(weekdays))
+
+
+def lesson_days(start, weekdays, count, closed=frozenset()):
+    """
+    First `count` lesson datetimes on or after `start` which follow the
+    weekly pattern and do not fall on a closed date. Whole weeks are laid
+    out arithmetically, only the closed dates are looked at one by one.
+    """
+    offsets = _week_offsets(start, weekdays)
+    first = start.date()
+    # every closed lesson day before the end pushes the end by one lesson
+    total = count
+    for offset in sorted((day - first).days for day in closed if day >= first):
+        weeks, weekday = divmod(offset, 7)
+        if weekday not in offsets:
+            continue
+        if weeks * len(offsets) + offsets.index(weekday) >= total:
+            break
+        total += 1
+    weeks, rest = divmod(total, len(offsets))
+    days = [
+        start + timedelta(days=week * 7 + offset)
+        for week in range(weeks)
+        for offset in offsets
+    ]
+    days += [start + timedelta(days=weeks * 7 + offset) for offset in offsets[:rest]]
+    return [day for day in days if day.date() not in closed]
+
+
+def closed_dates(branch_id) -> frozenset:
+    """
+    Upcoming holidays and closures of the branch, including the ones common
+    to all branches. Cached in process memory for a short time.
+    """
+    generation = cache.get_or_set(CLOSURES_GENERATION_KEY, 0, None)
+    cached = _closures.get(branch_id)
+    if cached and cached[0] > time.monotonic() and cached[1] == generation:
+        return cached[2]
+    dates = frozenset(Closure.objects.filter(
+        Q(branch_id=branch_id) | Q(branch__isnull=True),
+        date__gte=localdate() - timedelta(days=1),
+    ).values_list('date', flat=True))
+    _closures[branch_id] = time.monotonic() + CLOSURES_CACHE_TIMEOUT, generation, dates
+    return dates
+
+
+def clear_closed_dates():
+    """Forget cached closed dates in this process and in every worker."""
+    _closures.clear()
+    try:
+        cache.incr(CLOSURES_GENERATION_KEY)
+    except ValueError:
+        cache.set(CLOSURES_GENERATION_KEY, 1, None)
+
+
+def group_lesson_days(group, start, count):
+    return lesson_days(start, group.days, count, closed_dates(group.branch_id))
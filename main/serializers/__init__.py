@@ -3,26 +3,30 @@ from rest_framework.serializers import ValidationError  # noqa: F401
 from .utils import get_description  # noqa: F401
 from .absencereason import AbsenceReasonSerializer
 from .attendance import AttendanceSerializer
+from .attendance import CancelDateSrz
+from .attendance import RollCallSrz
 from .attendance import TookPlaceSrz
 from .group import GroupChangeLevelSrz
 from .group import GroupChangeTeacherSrz
 from .group import GroupCreateSrz
-from .group import GroupCompletedSrz
 from .group import GroupDetailSerializer
 from .group import GroupListSrz
+from .group import GroupMatchSrz
 from .group import GroupPendingCreateSerializer
-from .group import GroupTrialsSrz
+from .group import GroupRescheduleSrz
 from .group import GroupSellBook
+from .group import GroupStudentSrz
 from .group import GroupUpdateSrz
-from .group import GroupWithNoLessonSrz
 from .group import StudentSubscribeSerializer
 from .group import StudentUnsubscribeSerializer
 from .history import HistoryListSrz
 from .history import TeacherHistoryListSrz
 from .inventory import BookListSrz
 from .inventory import InventoryListSrz
+from .pending import MatchQuerySrz
 from .pending import PendingCreateSrz
 from .pending import PendingListSrz
+from .pending import PendingMatchSrz
 from .plan import PlanListSerializer
 from .student import AddAdditionalLessonSrz
 from .student import AddLessonSrz
@@ -39,17 +43,26 @@ from .student import StudentPendingSerializer
 from .student import StudentUpdateSrz
 from .student import StudentWhiteSrz
 from .student import TransferBalanceSrz
+from .studentlesson import ArchivedStudentLessonListSrz
 from .studentlesson import StudentLessonAttendanceSrz
 from .studentlesson import StudentLessonListSrz
 from .subject import SubjectSerializer
+from .teacher import FreeSlotSrz
 from .teacher import TeacherDetailSrz
 from .teacher import TeacherFireSrz
+from .teacher import TeacherFreeQuerySrz
+from .teacher import TeacherFreeSlotsQuerySrz
 from .teacher import TeacherSerializer
+from .teacher import TeacherShortSrz
 from .terminal import TerminalLoginObtainPair
+from .terminal import TerminalPaymentBatchResultSerializer
+from .terminal import TerminalPaymentBatchSerializer
 from .terminal import TerminalLoginResponseSerializer
 from .terminal import TerminalStudentCheckSerializer
 from .terminal import TerminalStudentPayResponseSerializer
 from .terminal import TerminalStudentPaySerializer
+from .token import BranchTokenObtainPairSerializer
+from .token import BranchTokenRefreshSerializer
 from .token import TokenObtainPairResponseSerializer
 from .token import TokenRefreshResponseSerializer
 from .token import TokenRefreshResponseSerializer
@@ -1,19 +1,40 @@
+from collections import Counter
+from collections import defaultdict
+from datetime import datetime
+from datetime import time
 from datetime import timedelta
 
+from django.db.models import Exists
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.transaction import atomic
+from django.utils.dateformat import format
+from django.utils.timezone import localdate
+from django.utils.timezone import localtime
+from django.utils.timezone import make_aware
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers as srz
 
+from ..cache import invalidate_boards
 from ..choices import Day
 from ..choices import Time
+from ..models import AbsenceReason
+from ..models import Closure
 from ..models import Group
+from ..models import History
 from ..models import Lesson
 from ..models import Student
 from ..models import StudentLesson
+from ..models import StudentGroupEnrollment
+from ..models import StudentGroupStatus
 from ..models import Teacher
+from ..models import TeacherHistory
 
 from .fields import ChoiceField
 from .utils import verbose_timedelta
+from ..schedule import closed_dates
+from ..schedule import lesson_days
 
 
 class TeacherPKSrz(srz.PrimaryKeyRelatedField):
@@ -98,37 +119,291 @@ class TookPlaceSrz(srz.ModelSerializer):
         fields = ('took_place', 'teacher', 'comment')
 
     def validate(self, attrs):
-        if attrs['took_place'] is False and not attrs['comment']:
+        if attrs['took_place'] is False and not attrs.get('comment'):
             raise srz.ValidationError(
                 {'comment': _('required when canceling lesson')}
             )
         return attrs
 
     def update(self, instance: Lesson, validated_data):
-        current_time = now()
-        fifteen_minutes_early = timedelta(minutes=15)
-        fifteen_minutes_later = timedelta(minutes=75)
+        check_lesson_can_be_marked(instance)
+        validated_data.pop('comment', None)
 
-        if instance.took_place is False:
+        return super().update(instance, validated_data)
+
+
+class RollCallStudentSrz(srz.Serializer):
+    student_lesson_id = srz.IntegerField()
+    has_participated = srz.BooleanField()
+    absence_reason = srz.IntegerField(required=False, allow_null=True)
+
+
+class RollCallSrz(srz.Serializer):
+    took_place = srz.BooleanField()
+    teacher = TeacherPKSrz(queryset=Teacher.objects, required=False)
+    comment = srz.CharField(required=False)
+    students = RollCallStudentSrz(many=True, required=False)
+
+    def validate(self, attrs):
+        if attrs['took_place'] is False and not attrs.get('comment'):
             raise srz.ValidationError(
-                _('Lesson already aborted')
+                {'comment': _('required when canceling lesson')}
             )
-        if instance.took_place:
+        items = attrs.get('students', [])
+        if attrs['took_place'] is False and items:
             raise srz.ValidationError(
-                _('Lesson already taken place')
+                {'students': _('Could not process. Student can not participate to '
+                               'a cancelled lesson')}
             )
-        if instance.completion_timestamp - current_time > fifteen_minutes_early:
-            delta = instance.completion_timestamp - fifteen_minutes_early - current_time
-            verbose = verbose_timedelta(delta)
-            raise srz.ValidationError(
-                _('Can not process. Try it %(delta)s later') % {'delta': verbose}
-             )
-        if current_time - instance.completion_timestamp > fifteen_minutes_later:
+
+        student_lessons = {
+            student_lesson.id: student_lesson
+            for student_lesson in self.instance.studentlesson_set.all()
+        }
+        absence_reasons = AbsenceReason.objects.in_bulk({
+            item['absence_reason'] for item in items if item.get('absence_reason')
+        })
+        errors = []
+        seen = set()
+        for item in items:
+            error = {}
+            student_lesson = student_lessons.get(item['student_lesson_id'])
+            absence_reason_id = item.get('absence_reason')
+            if student_lesson is None:
+                error['student_lesson_id'] = [_('This student lesson does not belong '
+                                                'to given lesson')]
+            elif student_lesson.id in seen:
+                error['student_lesson_id'] = [_('Duplicated student lesson')]
+            elif student_lesson.has_participated:
+                error['student_lesson_id'] = [_('This student already marked '
+                                                'as participated')]
+            if absence_reason_id and absence_reason_id not in absence_reasons:
+                error['absence_reason'] = [_('Absence reason does not exist')]
+            elif item['has_participated'] and absence_reason_id:
+                error['absence_reason'] = [_(
+                    'absence reason must not be null when student did not participated',
+                )]
+            errors.append(error)
+            if error:
+                continue
+            seen.add(student_lesson.id)
+            student_lesson.has_participated = item['has_participated']
+            student_lesson.absence_reason = absence_reasons.get(absence_reason_id)
+
+        if any(errors):
+            raise srz.ValidationError({'students': errors})
+        attrs['student_lessons'] = [student_lessons[pk] for pk in seen]
+        return attrs
+
+    def update(self, instance: Lesson, validated_data):
+        check_lesson_can_be_marked(instance)
+
+        instance.took_place = validated_data['took_place']
+        if teacher := validated_data.get('teacher'):
+            instance.teacher = teacher
+        instance.save(update_fields=('took_place', 'teacher'))
+        StudentLesson.objects.bulk_update(
+            validated_data['student_lessons'],
+            ('has_participated', 'absence_reason'),
+        )
+        if instance.took_place is False:
+            replace_cancelled_lessons(
+                instance.group.branch_id, [instance],
+                self.context['request'].user.fullname, validated_data.get('comment'),
+            )
+        return instance
+
+
+def check_lesson_can_be_marked(instance: Lesson):
+    current_time = now()
+    fifteen_minutes_early = timedelta(minutes=15)
+    fifteen_minutes_later = timedelta(minutes=75)
+
+    if instance.took_place is False:
+        raise srz.ValidationError(
+            _('Lesson already aborted')
+        )
+    if instance.took_place:
+        raise srz.ValidationError(
+            _('Lesson already taken place')
+        )
+    if instance.completion_timestamp - current_time > fifteen_minutes_early:
+        delta = instance.completion_timestamp - fifteen_minutes_early - current_time
+        verbose = verbose_timedelta(delta)
+        raise srz.ValidationError(
+            _('Can not process. Try it %(delta)s later') % {'delta': verbose}
+        )
+    if current_time - instance.completion_timestamp > fifteen_minutes_later:
+        raise srz.ValidationError(
+            _('Can not process. You had to marked this lesson earlier')
+        )
+
+
+class CancelDateSrz(srz.Serializer):
+    date = srz.DateField()
+    comment = srz.CharField()
+
+    def validate_date(self, date):
+        if date < localdate():
             raise srz.ValidationError(
-                _('Can not process. You had to marked this lesson earlier')
+                _('Should not be in past time'),
             )
+        return date
 
-        validated_data.pop('comment', None)
+    @atomic
+    def cancel(self):
+        """
+        Cancel every lesson of the branch on the date that has students and
+        give each affected student a lesson at the end of their sequence in
+        the group, with the plan and price of the cancelled one. The number
+        of queries does not depend on the number of groups.
+        """
+        branch_id = self.context['branch_id']
+        manager = self.context['request'].user.fullname
+        day = self.validated_data['date']
+        comment = self.validated_data['comment']
+
+        Closure.objects.get_or_create(
+            branch_id=branch_id, date=day, defaults={'reason': comment},
+        )
+        # Empty slots materialized ahead are left alone, nobody misses them
+        lessons = list(Lesson.objects.select_for_update().filter(
+            Exists(StudentLesson.objects.filter(lesson_id=OuterRef('pk'))),
+            group__branch_id=branch_id,
+            completion_timestamp__date=day,
+            took_place__isnull=True,
+        ))
+        Lesson.objects.filter(id__in=[lesson.id for lesson in lessons]).update(
+            took_place=False,
+        )
+        replacements = replace_cancelled_lessons(branch_id, lessons, manager, comment)
+        TeacherHistory.objects.bulk_create([
+            TeacherHistory(
+                teacher_id=lesson.teacher_id,
+                group_id=lesson.group_id,
+                manager=manager,
+                description=f'Отмена урока, комментарий: {comment}',
+            )
+            for lesson in lessons
+        ])
+        invalidate_boards(branch_id, [day])
+        return {
+            'cancelled': len(lessons),
+            'replaced': sum(len(new_lessons) for new_lessons in replacements.values()),
+        }
+
+
+def replace_cancelled_lessons(branch_id, lessons, manager, comment):
+    """
+    Give each student of the cancelled lessons a lesson at the end of their
+    sequence in the group, with the plan and price of the cancelled one, so
+    a cancelled lesson is never lost nor refunded. Return the new lessons
+    keyed by (student id, group id).
+    """
+    originals = defaultdict(list)
+    for student_id, group_id, plan_id, lesson_price, timestamp in StudentLesson.objects.filter(
+        lesson__in=lessons,
+        student__isnull=False,
+    ).values_list('student_id', 'lesson__group_id', 'plan_id', 'lesson_price',
+                  'lesson__completion_timestamp'):
+        originals[student_id, group_id].append((plan_id, lesson_price, localtime(timestamp)))
+    cancelled = Counter({pair: len(items) for pair, items in originals.items()})
+    replacements = get_replacements(branch_id, cancelled)
+
+    StudentLesson.objects.bulk_create([
+        StudentLesson(
+            student_id=student_id,
+            lesson=lesson,
+            plan_id=plan_id,
+            lesson_price=lesson_price,
+        )
+        for (student_id, group_id), new_lessons in replacements.items()
+        for lesson, (plan_id, lesson_price, _cancelled_at) in zip(
+            new_lessons, originals[student_id, group_id],
+        )
+    ])
+    histories = History.objects.bulk_create([
+        History(
+            student_id=student_id,
+            group_id=group_id,
+            manager=manager,
+            description=f'Урок {format(originals[student_id, group_id][0][2], "d-M Y")} '
+                        f'отменен, студенту перенесены уроки в количестве: '
+                        f'{len(new_lessons)}, с '
+                        f'{format(localtime(new_lessons[0].completion_timestamp), "d-M Y")} до '
+                        f'{format(localtime(new_lessons[-1].completion_timestamp), "d-M Y")}',
+            comment=comment,
+        )
+        for (student_id, group_id), new_lessons in replacements.items()
+        if new_lessons
+    ])
+    StudentGroupStatus.objects.record(histories)
+    StudentGroupEnrollment.objects.refresh(cancelled)
+    invalidate_boards(branch_id, [
+        lesson.completion_timestamp
+        for new_lessons in replacements.values()
+        for lesson in new_lessons
+    ])
+    return replacements
 
-        return super().update(instance, validated_data)
 
+def get_replacements(branch_id, cancelled):
+    """
+    New lessons for every (student, group) pair, as many as the pair lost.
+    They follow the last lesson of the student in the group. Slots where
+    the teacher is busy are skipped and the next lesson day is taken.
+    """
+    if not cancelled:
+        return {}
+    student_ids = {student_id for student_id, _ in cancelled}
+    group_ids = {group_id for _, group_id in cancelled}
+    last_lessons = {
+        (row['student_id'], row['lesson__group_id']): row['last']
+        for row in StudentLesson.objects.filter(
+            student_id__in=student_ids,
+            lesson__group_id__in=group_ids,
+        ).values('student_id', 'lesson__group_id').annotate(
+            last=Max('lesson__completion_timestamp'),
+        )
+    }
+    groups = Group.all_objects.in_bulk(group_ids)
+    # Lessons can not be scheduled for a group without a teacher
+    if without_teacher := sorted(
+        group.name for group in groups.values() if group.current_teacher_id is None
+    ):
+        raise srz.ValidationError(_(
+            'Could not process. Assign a teacher to these groups first: %(groups)s'
+        ) % {'groups': ', '.join(without_teacher)})
+    closed = set(closed_dates(branch_id))
+    blocked = defaultdict(set)
+    replacements = {}
+    pending = set(cancelled)
+    while pending:
+        days = {}
+        for student_id, group_id in pending:
+            group = groups[group_id]
+            last = localtime(last_lessons[student_id, group_id])
+            start = make_aware(datetime.combine(
+                last.date() + timedelta(days=1), time(group.start_time),
+            ))
+            count = cancelled[student_id, group_id]
+            days[student_id, group_id] = [
+                day for day in lesson_days(
+                    start, group.days, count + len(blocked[group_id]), closed,
+                ) if day not in blocked[group_id]
+            ][:count]
+        slots = defaultdict(set)
+        for (_student_id, group_id), group_days in days.items():
+            slots[groups[group_id]].update(group_days)
+        lessons = Lesson.objects.ensure_many(slots)
+        pending = set()
+        for (student_id, group_id), group_days in days.items():
+            missing = [day for day in group_days if (group_id, day) not in lessons]
+            if missing:
+                blocked[group_id].update(missing)
+                pending.add((student_id, group_id))
+            else:
+                replacements[student_id, group_id] = [
+                    lessons[group_id, day] for day in group_days
+                ]
+    return replacements
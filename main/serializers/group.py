@@ -1,6 +1,11 @@
-from django.db.models import Sum, Exists, OuterRef, Q
-from django.db.models.functions import Coalesce
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+
+from django.db.models import Q
 from django.db.transaction import atomic
+from django.utils.timezone import localtime
+from django.utils.timezone import make_aware
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers as srz
@@ -8,10 +13,16 @@ from rest_framework import serializers as srz
 
 from main import models
 from .fields import ChoiceField
+from .loaders import LoaderListSerializer
+from .loaders import get_loader
+from .loaders import status_text
+from ..cache import invalidate_boards
+from ..choices import BalanceEntryKind
 from ..choices import Day
 from ..choices import Role
 from ..choices import Time
-from ..models.fields import MoneyField
+from ..schedule import closed_dates
+from ..schedule import lesson_days
 
 
 class BookSrz(srz.ModelSerializer):
@@ -42,6 +53,7 @@ class StudentSerializer(srz.HyperlinkedModelSerializer):
     class Meta:
         model = models.Student
         fields = 'url', 'id', 'status', 'phone', 'fullname', 'birth_day', 'age'
+        list_serializer_class = LoaderListSerializer
 
     def get_age(self, instance) -> int:
         today = now().today()
@@ -50,16 +62,19 @@ class StudentSerializer(srz.HyperlinkedModelSerializer):
             (today.month, today.day) < (born.month, born.day)
         )
 
-    def get_status(self, instance: models.Student) -> str:
-        if hasattr(instance, 'status') and instance.status:
-            return f'{instance.status.description} ' \
-                   f'{instance.status.comment or ""}'.strip()
+    def get_status_key(self, instance: models.Student):
+        if group_id := getattr(instance, 'status_group_id', None):
+            return instance.id, group_id
         if group := self.context.get('group'):
-            if history := models.History.objects.filter(
-                student=instance,
-                group=group,
-            ).first():
-                return f'{history.description} {history.comment or ""}'.strip()
+            return instance.id, group.id
+
+    def prime(self, instance: models.Student):
+        if key := self.get_status_key(instance):
+            get_loader(self.context, 'status').prime([key])
+
+    def get_status(self, instance: models.Student) -> str:
+        if key := self.get_status_key(instance):
+            return status_text(get_loader(self.context, 'status').load(key))
 
 
 class TeacherSrz(srz.HyperlinkedModelSerializer):
@@ -104,7 +119,6 @@ class GroupUpdateSrz(srz.ModelSerializer):
 class GroupListSrz(srz.HyperlinkedModelSerializer):
     days_type = ChoiceField(Day.choices)
     start_time = ChoiceField(Time.choices)
-    student_count = srz.SerializerMethodField(method_name='get_student_count')
     current_teacher = TeacherSrz(read_only=True)
     subject = srz.SlugRelatedField('title', read_only=True)
 
@@ -116,97 +130,52 @@ class GroupListSrz(srz.HyperlinkedModelSerializer):
             'student_count',
         )
 
-    def get_student_count(self, instance=None) -> int:
-        if instance:
-            return instance.students.count()
 
+class GroupMatchSrz(GroupListSrz):
+    """Group fitting a pending student, `score` is set by the matching index."""
+    score = srz.IntegerField(read_only=True)
 
-class GroupTrialsSrz(srz.HyperlinkedModelSerializer):
-    days_type = ChoiceField(Day.choices)
-    start_time = ChoiceField(Time.choices)
-    subject = srz.SlugRelatedField('title', read_only=True)
-    students = StudentSerializer(source='student_set', many=True)
+    class Meta(GroupListSrz.Meta):
+        fields = GroupListSrz.Meta.fields + ('score',)
 
-    class Meta:
-        model = models.Group
-        fields = ('url', 'id', 'name', 'days_type', 'start_time', 'subject',
-                  'students')
 
-    def to_representation(self, instance):
-        lessons = instance.lesson_set.filter(
-            studentlesson__plan_id=1,
-            took_place=False,
-        ).distinct()
-        students = []
-        for lesson in lessons:
-            student_lessons = lesson.studentlesson_set.filter(
-                plan_id=1,
-            ).select_related('student')
-            for student_lesson in student_lessons:
-                student_lesson.student.status = models.History.objects.filter(
-                    student_id=student_lesson.student_id,
-                    group=instance,
-                ).first()
-                students.append(student_lesson.student)
-        instance.student_set = students
-        representation = super().to_representation(instance)
-        return representation
-
-
-class GroupWithNoLessonSrz(srz.HyperlinkedModelSerializer):
-    days_type = ChoiceField(Day.choices)
-    start_time = ChoiceField(Time.choices)
-    subject = srz.SlugRelatedField('title', read_only=True)
-    students = StudentSerializer(many=True)
+class GroupStudentSrz(srz.ModelSerializer):
+    """
+    Flat row of a student in a group, one per enrollment. Url and id are
+    the student's ones.
+    """
+    url = srz.HyperlinkedRelatedField('student-detail', source='student', read_only=True)
+    id = srz.IntegerField(source='student_id', read_only=True)
+    name = srz.CharField(source='group.name', read_only=True)
+    days_type = ChoiceField(Day.choices, source='group.days_type', read_only=True)
+    start_time = ChoiceField(Time.choices, source='group.start_time', read_only=True)
+    subject = srz.CharField(source='group.subject.title', read_only=True)
+    status = srz.SerializerMethodField('get_status')
+    phone = srz.CharField(source='student.phone', read_only=True)
+    fullname = srz.CharField(source='student.fullname', read_only=True)
+    birth_day = srz.DateField(source='student.birth_day', read_only=True)
+    age = srz.SerializerMethodField('get_age')
 
     class Meta:
-        model = models.Group
-        fields = ('url', 'id', 'name', 'days_type', 'start_time', 'subject',
-                  'students')
+        model = models.StudentGroupEnrollment
+        fields = ('url', 'id', 'group', 'name', 'days_type', 'start_time', 'subject',
+                  'status', 'phone', 'fullname', 'birth_day', 'age')
+        list_serializer_class = LoaderListSerializer
 
-    def to_representation(self, instance):
-        for student in instance.students.all():
-            student.status = models.History.objects.filter(
-                student_id=student.id,
-                group=instance,
-            ).first()
-        representation = super().to_representation(instance)
-        return representation
-
-
-class GroupCompletedSrz(srz.HyperlinkedModelSerializer):
-    days_type = ChoiceField(Day.choices)
-    start_time = ChoiceField(Time.choices)
-    subject = srz.SlugRelatedField('title', read_only=True)
-    students = StudentSerializer(source='student_set', many=True)
+    def prime(self, instance: models.StudentGroupEnrollment):
+        get_loader(self.context, 'status').prime([(instance.student_id, instance.group_id)])
 
-    class Meta:
-        model = models.Group
-        fields = ('url', 'id', 'name', 'days_type', 'start_time', 'subject',
-                  'students')
+    def get_status(self, instance: models.StudentGroupEnrollment) -> str:
+        return status_text(get_loader(self.context, 'status').load(
+            (instance.student_id, instance.group_id),
+        ))
 
-    def to_representation(self, instance):
-        students = models.Student.objects.filter(
-            Exists(models.StudentLesson.objects.filter(
-                student_id=OuterRef('pk'),
-                lesson__group_id=instance.id,
-                student__groups=instance,
-            )),
-            ~Exists(models.StudentLesson.objects.filter(
-                Q(lesson__took_place=False) | Q(lesson__took_place__isnull=True),
-                student_id=OuterRef('pk'),
-                lesson__group_id=instance.id,
-                student__groups=instance,
-            ))
+    def get_age(self, instance) -> int:
+        today = now().today()
+        born = instance.student.birth_day
+        return today.year - born.year - (
+            (today.month, today.day) < (born.month, born.day)
         )
-        for student in students:
-            student.status = models.History.objects.filter(
-                    student_id=student.id,
-                    group=instance,
-                ).first()
-        instance.student_set = students
-        representation = super().to_representation(instance)
-        return representation
 
 
 class PendingSerializer(srz.ModelSerializer):
@@ -236,42 +205,12 @@ class GroupDetailSerializer(srz.ModelSerializer):
         )
 
     def to_representation(self, instance):
-        lessons = instance.lesson_set.filter(
-            studentlesson__plan_id=1,
-            took_place=False,
-        ).distinct()
-        students = []
-        for lesson in lessons:
-            student_lessons = lesson.studentlesson_set.filter(
-                plan_id=1,
-            ).select_related('student')
-            for student_lesson in student_lessons:
-                student_lesson.student.status = models.History.objects.filter(
-                    student_id=student_lesson.student_id,
-                    group=instance,
-                ).first()
-                students.append(student_lesson.student)
-        instance.trials = students
-
-        students = models.Student.objects.filter(
-            Exists(models.StudentLesson.objects.filter(
-                student_id=OuterRef('pk'),
-                lesson__group_id=instance.id,
-                student__groups=instance,
-            )),
-            ~Exists(models.StudentLesson.objects.filter(
-                Q(lesson__took_place=False) | Q(lesson__took_place__isnull=True),
-                student_id=OuterRef('pk'),
-                lesson__group_id=instance.id,
-                student__groups=instance,
-            ))
+        get_loader(self.context, 'status').prime(
+            (student.id, instance.id)
+            for student in (*instance.students.all(), *instance.unsubscribed.all())
         )
-        for student in students:
-            student.status = models.History.objects.filter(
-                    student_id=student.id,
-                    group=instance,
-                ).first()
-        instance.completed = students
+        instance.trials = get_loader(self.context, 'trials').load(instance.id) or []
+        instance.completed = get_loader(self.context, 'completed').load(instance.id) or []
 
         representaion = super().to_representation(instance)
 
@@ -310,20 +249,26 @@ class StudentUnsubscribeSerializer(srz.Serializer):
     def unsubscribe(self, validated_data):
         group = validated_data['group']
         student = self.context['student']
-        studentlessons = models.StudentLesson.objects.exclude(
-            Q(has_participated=True) | Q(lesson__took_place=True)
+        # The refund is the price of exactly the lessons removed here, the
+        # ones not held yet. They stay locked until the transaction ends.
+        student_lessons = list(models.StudentLesson.objects.select_for_update(
+            of=('self',),
         ).filter(
             student=student,
             lesson__group=group,
-        )
-        left_balance = studentlessons.aggregate(
-            total_price=Coalesce(Sum('lesson_price'), 0, output_field=MoneyField()),
-        ).get('total_price', 0)
-        student.balance += left_balance
-        studentlessons.delete()
+            lesson__took_place__isnull=True,
+            has_participated=False,
+        ).only('id', 'lesson_price'))
+        left_balance = sum(student_lesson.lesson_price for student_lesson in student_lessons)
+        lesson_count = len(student_lessons)
+        models.StudentLesson.objects.filter(
+            id__in=[student_lesson.id for student_lesson in student_lessons],
+        ).delete()
+        if left_balance:
+            models.BalanceEntry.objects.post(student, left_balance,
+                                             BalanceEntryKind.REFUND)
         student.groups.remove(group)
         student.past_groups.add(group)
-        student.save()
         models.History.objects.create(
             student=student,
             group=group,
@@ -335,7 +280,7 @@ class StudentUnsubscribeSerializer(srz.Serializer):
             student=student,
             group=group,
             description=f'{left_balance} сомов переведен на счет студента '
-                        f'по остаткам уроков, количество уроков: {len(studentlessons)}',
+                        f'по остаткам уроков, количество уроков: {lesson_count}',
         )
 
 
@@ -383,13 +328,82 @@ class GroupSellBook(srz.Serializer):
     def sell_book(self):
         student = self.validated_data['student']
         book = self.context['book']
-        student.balance -= book.price
+        models.BalanceEntry.objects.post(student, -book.price, BalanceEntryKind.BOOK)
         book.count -= 1
         book.save()
-        student.save()
         models.History.objects.create(
             student=student,
             group=self.context['group'],
             description=f'Cтудент совершил оплату {book.price} сомов '
                         f'на книгу {book.name}'
         )
+
+
+class GroupRescheduleSrz(srz.Serializer):
+    days_type = srz.ChoiceField(Day.choices)
+    start_time = srz.ChoiceField(Time.choices)
+    comment = srz.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        group = self.context['group']
+        days_type = attrs['days_type']
+        busy = models.Group.objects.filter(
+            current_teacher_id=group.current_teacher_id,
+            start_time=attrs['start_time'],
+        ).exclude(pk=group.pk)
+        busy = busy.filter(days_type__gt=0) if days_type else busy.filter(days_type=0)
+        if group.current_teacher_id and busy.exists():
+            raise srz.ValidationError(
+                _('The teacher of this group already has a group at this time'),
+            )
+        return attrs
+
+    def get_new_timestamps(self, group, lessons):
+        """
+        New slots for the lessons in the same order, skipping closed dates
+        and slots still held by other lessons of the group or its teachers.
+        """
+        current = localtime(now())
+        start = make_aware(datetime.combine(current.date(), time(group.start_time)))
+        if start <= current:
+            start += timedelta(days=1)
+        teacher_ids = {lesson.teacher_id for lesson in lessons}
+        moving = [lesson.id for lesson in lessons]
+        closed = closed_dates(group.branch_id)
+        count = len(lessons)
+        while True:
+            candidates = lesson_days(start, group.days, count, closed)
+            occupied = set(models.Lesson.objects.filter(
+                Q(group=group) | Q(teacher_id__in=teacher_ids),
+                completion_timestamp__in=candidates,
+            ).exclude(id__in=moving).values_list('completion_timestamp', flat=True))
+            free = [timestamp for timestamp in candidates if timestamp not in occupied]
+            if len(free) >= len(lessons):
+                return free[:len(lessons)]
+            count += len(lessons) - len(free)
+
+    @atomic
+    def reschedule(self):
+        group = self.context['group']
+        group.days_type = self.validated_data['days_type']
+        group.start_time = self.validated_data['start_time']
+        group.save(update_fields=('days_type', 'start_time'))
+
+        lessons = list(models.Lesson.objects.select_for_update().filter(
+            group=group,
+            took_place__isnull=True,
+            completion_timestamp__gt=now(),
+        ).order_by('completion_timestamp'))
+        if not lessons:
+            return 0
+        timestamps = self.get_new_timestamps(group, lessons)
+        moved = models.Lesson.objects.move({
+            lesson.id: timestamp for lesson, timestamp in zip(lessons, timestamps)
+        })
+        invalidate_boards(group.branch_id, [
+            *(lesson.completion_timestamp for lesson in lessons), *timestamps,
+        ])
+        models.StudentGroupEnrollment.objects.refresh_lessons(
+            lesson.id for lesson in lessons
+        )
+        return moved
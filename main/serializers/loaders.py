@@ -0,0 +1,99 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db.models import F
+from django.db.models import Manager
+from django.db.models import Q
+from rest_framework import serializers as srz
+
+from main import models
+from ..choices import EnrollmentState
+
+
+class Loader:
+    """
+    Collects keys while a response is serialized and resolves all of them
+    with one query the first time any value is needed.
+    """
+
+    def __init__(self, batch, context):
+        self.batch = batch
+        self.context = context
+        self.keys = set()
+        self.values = {}
+
+    def prime(self, keys):
+        self.keys.update(key for key in keys if key not in self.values)
+
+    def load(self, key):
+        if key not in self.values:
+            self.keys.add(key)
+            keys, self.keys = self.keys, set()
+            self.values.update(dict.fromkeys(keys))
+            self.values.update(self.batch(keys, self.context))
+        return self.values[key]
+
+
+def get_loader(context: dict, name: str) -> Loader:
+    """Loader of the given kind shared by all serializers of a response."""
+    loaders = context.setdefault('loaders', {})
+    if name not in loaders:
+        loaders[name] = Loader(BATCHES[name], context)
+    return loaders[name]
+
+
+class LoaderListSerializer(srz.ListSerializer):
+    """Lets the child prime its loaders with every item before serializing any."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        if prime := getattr(self.child, 'prime', None):
+            for item in items:
+                prime(item)
+        return [self.child.to_representation(item) for item in items]
+
+
+def status_text(status) -> str:
+    if status:
+        return f'{status.description} {status.comment or ""}'.strip()
+
+
+def load_statuses(keys, context):
+    """StudentGroupStatus of (student_id, group_id) pairs."""
+    students = defaultdict(list)
+    for student_id, group_id in keys:
+        students[group_id].append(student_id)
+    statuses = models.StudentGroupStatus.objects.filter(reduce(or_, (
+        Q(group_id=group_id, student_id__in=student_ids)
+        for group_id, student_ids in students.items()
+    )))
+    return {(status.student_id, status.group_id): status for status in statuses}
+
+
+def group_students(students, context):
+    """Group students by `status_group_id` and prime their statuses."""
+    groups = defaultdict(list)
+    for student in students:
+        groups[student.status_group_id].append(student)
+    get_loader(context, 'status').prime(
+        (student.id, student.status_group_id) for student in students
+    )
+    return groups
+
+
+def students_in_state(state):
+    """Batch of the students whose enrollment in the group is in `state`."""
+    def load(keys, context):
+        return group_students(models.Student.objects.filter(
+            enrollments__group_id__in=keys,
+            enrollments__state=state,
+        ).annotate(status_group_id=F('enrollments__group_id')), context)
+    return load
+
+
+BATCHES = {
+    'completed': students_in_state(EnrollmentState.COMPLETED),
+    'status': load_statuses,
+    'trials': students_in_state(EnrollmentState.TRIAL),
+}
@@ -39,3 +39,15 @@ class PendingCreateSrz(srz.ModelSerializer):
         model = models.Pending
         fields = ('id', 'subject', 'student', 'teacher', 'level', 'days_type',
                   'start_time', 'comment')
+
+
+class PendingMatchSrz(PendingListSrz):
+    """Pending student fitting a group, `score` is set by the matching index."""
+    score = srz.IntegerField(read_only=True)
+
+    class Meta(PendingListSrz.Meta):
+        fields = PendingListSrz.Meta.fields + ('score',)
+
+
+class MatchQuerySrz(srz.Serializer):
+    limit = srz.IntegerField(min_value=1, max_value=100, default=10)
@@ -2,19 +2,26 @@ from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
 
-from django.db.models import F
 from django.db.transaction import atomic
 from django.utils.dateformat import format
+from django.utils.timezone import is_naive
+from django.utils.timezone import localtime
+from django.utils.timezone import make_aware
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers as srz
 
 from .fields import ChoiceField
 from .fields import MoneyField
-from .utils import daterange
+from .loaders import LoaderListSerializer
+from .loaders import get_loader
+from .loaders import status_text
+from ..cache import invalidate_boards
+from ..choices import BalanceEntryKind
 from ..choices import Day
 from ..choices import Plan as PlanChoice
 from ..choices import Time
+from ..models import BalanceEntry
 from ..models import Book
 from ..models import Group
 from ..models import History
@@ -22,9 +29,11 @@ from ..models import Lesson
 from ..models import Pending
 from ..models import Plan
 from ..models import Student
+from ..models import StudentGroupEnrollment
 from ..models import StudentLesson
 from ..models import Subject
 from ..models import Teacher
+from ..schedule import group_lesson_days
 
 
 class BookSrz(srz.ModelSerializer):
@@ -38,7 +47,6 @@ class GroupSrz(srz.HyperlinkedModelSerializer):
     start_time = ChoiceField(Time.choices)
     subject = srz.SlugRelatedField('title', read_only=True)
     current_teacher = srz.SlugRelatedField('fullname', read_only=True)
-    student_count = srz.SerializerMethodField('get_student_count')
     status = srz.SerializerMethodField('get_status')
     book = BookSrz(read_only=True)
 
@@ -46,18 +54,15 @@ class GroupSrz(srz.HyperlinkedModelSerializer):
         model = Group
         fields = ('id', 'name', 'days_type', 'start_time', 'subject', 'current_teacher',
                   'student_count', 'max_student_count', 'status', 'book')
+        list_serializer_class = LoaderListSerializer
 
-    def get_student_count(self, instance=None):
-        if instance:
-            return instance.students.count()
+    def prime(self, instance: Group):
+        if student := self.context.get('student'):
+            get_loader(self.context, 'status').prime([(student.id, instance.id)])
 
     def get_status(self, instance: Group) -> str:
         if student := self.context.get('student'):
-            if history := History.objects.filter(
-                student=student,
-                group=instance,
-            ).first():
-                return f'{history.description} {history.comment or ""}'.strip()
+            return status_text(get_loader(self.context, 'status').load((student.id, instance.id)))
 
 
 class PendingSrz(srz.ModelSerializer):
@@ -194,8 +199,7 @@ class AddLessonBaseSrz(srz.Serializer):
         lesson_count = self.get_lesson_count(self.validated_data)
         total_fee = self.calculate_total_fee(plan, lesson_count)
 
-        student.balance = F('balance') - total_fee
-        student.save()
+        BalanceEntry.objects.post(student, -total_fee, BalanceEntryKind.LESSONS)
 
         last_lesson = Lesson.objects.filter(
             group=group,
@@ -218,28 +222,19 @@ class AddLessonBaseSrz(srz.Serializer):
                 day=start_from.day,
                 hour=group.start_time,
             )
-        days = daterange(start_time, group.days, lesson_count)
-        student_lessons = []
+        days = group_lesson_days(group, start_time, lesson_count)
         lesson_price = Decimal(total_fee / lesson_count)
-        for day in days:
-            try:
-                lesson = Lesson.objects.get(
-                    group=group,
-                    completion_timestamp=day,
-                )
-            except Lesson.DoesNotExist:
-                lesson = Lesson.objects.create(
-                    group=group,
-                    teacher=group.current_teacher,
-                    completion_timestamp=day,
-                )
-            student_lessons.append(StudentLesson(
+        StudentLesson.objects.bulk_create([
+            StudentLesson(
                 student=student,
                 lesson=lesson,
                 lesson_price=lesson_price,
                 plan=plan,
-            ))
-        StudentLesson.objects.bulk_create(student_lessons)
+            )
+            for lesson in self.get_lessons(group, days)
+        ])
+        invalidate_boards(group.branch_id, days)
+        StudentGroupEnrollment.objects.refresh([(student.id, group.id)])
 
         desc_text = f'Cтудент совершил оплату на курс {group.name}, с ' \
                     f'{format(days[0], "d-M Y")} до ' \
@@ -257,6 +252,25 @@ class AddLessonBaseSrz(srz.Serializer):
             comment=self.validated_data.get('comment'),
         )
 
+    def get_lessons(self, group, days) -> list[Lesson]:
+        """
+        Lessons of the group for every given day, creating the missing slots
+        at once. Query count does not depend on the number of days.
+        """
+        if group.current_teacher_id is None:
+            raise srz.ValidationError(
+                {'group': [_('This group has no teacher')]}
+            )
+        days = [make_aware(day) if is_naive(day) else day for day in days]
+        lessons = Lesson.objects.ensure_slots(group, days)
+        if busy := [day for day in days if day not in lessons]:
+            raise srz.ValidationError(
+                {'group': [_('Teacher of this group already has a lesson at %(time)s') % {
+                    'time': format(localtime(busy[0]), 'd-M Y H:i'),
+                }]}
+            )
+        return [lessons[day] for day in days]
+
     def get_plan(self, attrs) -> Plan:
         raise NotImplementedError()
 
@@ -343,25 +357,17 @@ class AddTrialLessonSrz(AddLessonBaseSrz):
             day=start_from.day,
             hour=group.start_time,
         )
-        day = daterange(start_time, group.days, lesson_count)[0]
+        day = group_lesson_days(group, start_time, lesson_count)[0]
         lesson_price = 0
-        try:
-            lesson = Lesson.objects.get(
-                group=group,
-                completion_timestamp=day,
-            )
-        except Lesson.DoesNotExist:
-            lesson = Lesson.objects.create(
-                group=group,
-                teacher=group.current_teacher,
-                completion_timestamp=day,
-            )
+        lesson, = self.get_lessons(group, [day])
         student_lesson = StudentLesson.objects.create(
             student=student,
             lesson=lesson,
             lesson_price=lesson_price,
             plan=plan,
         )
+        invalidate_boards(group.branch_id, [day])
+        StudentGroupEnrollment.objects.refresh([(student.id, group.id)])
         History.objects.create(
             student=student,
             manager=self.context['request'].user.fullname,
@@ -416,23 +422,11 @@ class AddLoanLessonSrz(AddLessonBaseSrz):
             day=start_from.day,
             hour=group.start_time,
         )
-        day = daterange(start_time, group.days, lesson_count)[0]
+        day = group_lesson_days(group, start_time, lesson_count)[0]
         lesson_price = plan.single_price
+        lesson, = self.get_lessons(group, [day])
 
-        try:
-            lesson = Lesson.objects.get(
-                group=group,
-                completion_timestamp=day,
-            )
-        except Lesson.DoesNotExist:
-            lesson = Lesson.objects.create(
-                group=group,
-                teacher=group.current_teacher,
-                completion_timestamp=day,
-            )
-
-        student.balance = F('balance') - lesson_price
-        student.save()
+        BalanceEntry.objects.post(student, -lesson_price, BalanceEntryKind.LOAN)
 
         student_lesson = StudentLesson.objects.create(
             student=student,
@@ -440,6 +434,8 @@ class AddLoanLessonSrz(AddLessonBaseSrz):
             lesson_price=lesson_price,
             plan=plan,
         )
+        invalidate_boards(group.branch_id, [day])
+        StudentGroupEnrollment.objects.refresh([(student.id, group.id)])
         History.objects.create(
             student=student,
             manager=self.context['request'].user.fullname,
@@ -500,10 +496,12 @@ class TransferBalanceSrz(srz.Serializer):
         sender = self.context['student']
         receiver = validated_data['receiver']
         amount = validated_data['amount']
-        sender.balance -= amount
-        receiver.balance += amount
-        sender.save()
-        receiver.save()
+        BalanceEntry.objects.post_many([
+            BalanceEntry(student=sender, amount=-amount,
+                         kind=BalanceEntryKind.TRANSFER_OUT),
+            BalanceEntry(student=receiver, amount=amount,
+                         kind=BalanceEntryKind.TRANSFER_IN),
+        ])
         History.objects.create(
             student=sender,
             manager=self.context['request'].user.fullname,
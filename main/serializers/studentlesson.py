@@ -2,6 +2,8 @@ from django.db import IntegrityError
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers as srz
 
+from ..models import ArchivedLesson
+from ..models import ArchivedStudentLesson
 from ..models import Student
 from ..models import StudentLesson
 
@@ -24,6 +26,22 @@ class StudentLessonListSrz(srz.ModelSerializer):
         fields = 'id', 'student', 'lesson', 'has_participated', 'absence_reason'
 
 
+class ArchivedLessonSrz(srz.ModelSerializer):
+    class Meta:
+        model = ArchivedLesson
+        fields = 'id', 'completion_timestamp', 'took_place'
+
+
+class ArchivedStudentLessonListSrz(srz.ModelSerializer):
+    student = StudentSerializerForMembership()
+    lesson = ArchivedLessonSrz()
+    absence_reason = srz.SlugRelatedField('name', read_only=True)
+
+    class Meta:
+        model = ArchivedStudentLesson
+        fields = 'id', 'student', 'lesson', 'has_participated', 'absence_reason'
+
+
 class StudentLessonAttendanceSrz(srz.ModelSerializer):
     class Meta:
         model = StudentLesson
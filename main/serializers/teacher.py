@@ -61,3 +61,24 @@ class TeacherSerializer(srz.HyperlinkedModelSerializer):
 
 class TeacherFireSrz(srz.Serializer):
     comment = srz.CharField()
+
+
+class TeacherFreeQuerySrz(srz.Serializer):
+    days_type = ChoiceField(Day.choices)
+    start_time = ChoiceField(Time.choices)
+    date = srz.DateField(required=False)
+
+
+class TeacherFreeSlotsQuerySrz(srz.Serializer):
+    date = srz.DateField(required=False)
+
+
+class TeacherShortSrz(srz.ModelSerializer):
+    class Meta:
+        model = Teacher
+        fields = ('id', 'fullname', 'phone')
+
+
+class FreeSlotSrz(srz.Serializer):
+    days_type = ChoiceField(Day.choices)
+    start_time = ChoiceField(Time.choices)
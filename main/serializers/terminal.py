@@ -1,13 +1,17 @@
+from django.db import IntegrityError
 from django.db.transaction import atomic
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers as srz
 from rest_framework.exceptions import NotFound
 from rest_framework.fields import empty
 
+from main.choices import BalanceEntryKind
+from main.models import BalanceEntry
 from main.models import Payment, History
 from main.models import Student
 from main.models import Terminal
 
+from .fields import ChoiceField
 from .fields import MoneyField
 
 
@@ -49,10 +53,12 @@ class TerminalStudentCheckSerializer(srz.Serializer):
 
     def validate_phone(self, phone):
         try:
-            self.student = Student.objects.get(phone=phone)
+            self.student = Student.objects.by_phone(phone)
             return phone
         except Student.DoesNotExist:
             raise NotFound
+        except Student.MultipleObjectsReturned:
+            raise srz.ValidationError(_('Several students have this phone number'))
 
     def validate(self, attrs):
         attrs['name'] = self.student.fullname
@@ -69,6 +75,7 @@ class TerminalStudentPaySerializer(srz.Serializer):
     id = srz.IntegerField(min_value=1, read_only=True)
     phone = srz.CharField()
     amount = MoneyField()
+    idempotency_key = srz.CharField(max_length=64, required=False, write_only=True)
 
     def __init__(self, instance=None, data=empty, **kwargs):
         self.student = None
@@ -76,26 +83,136 @@ class TerminalStudentPaySerializer(srz.Serializer):
 
     def validate_phone(self, phone):
         try:
-            self.student = Student.objects.get(phone=phone)
+            self.student = Student.objects.by_phone(phone)
         except Student.DoesNotExist:
             raise NotFound
+        except Student.MultipleObjectsReturned:
+            raise srz.ValidationError(_('Several students have this phone number'))
 
         return phone
 
     @atomic
     def create(self, validated_data):
-        self.student.balance += validated_data['amount']
-        self.student.save()
         self.fields.pop('phone')
+        terminal = self.context['request'].terminal
+        key = validated_data.get('idempotency_key')
+        if key is not None:
+            # Keyed payments of the terminal are applied one after another,
+            # the same way as batches, so they never race for a key
+            Terminal.objects.select_for_update().get(id=terminal.id)
+        try:
+            with atomic():
+                payment = Payment.objects.create(amount=self.validated_data['amount'],
+                                                 terminal=terminal,
+                                                 student=self.student,
+                                                 idempotency_key=key)
+        except IntegrityError:
+            if key is None:
+                raise
+            # A retry of a payment which is already applied
+            payment = Payment.objects.get(terminal=terminal, idempotency_key=key)
+            if payment.student_id != self.student.id or payment.amount != validated_data['amount']:
+                raise srz.ValidationError(
+                    {'idempotency_key': _('This key was used for another payment')}
+                )
+            return payment
+        BalanceEntry.objects.post(self.student, payment.amount,
+                                  BalanceEntryKind.TERMINAL_PAYMENT, payment=payment)
         History.objects.create(
             student=self.student,
             description=f'Студент совершил платеж в размере '
                         f'{validated_data["amount"]} сом',
             manager=self.context['request'].terminal.name,
         )
-        return Payment.objects.create(amount=self.validated_data['amount'],
-                                      terminal=self.context['request'].terminal,
-                                      student=self.student)
+        return payment
+
+    def update(self, instance, validated_data):
+        raise NotImplementedError()
+
+
+class TerminalPaymentBatchItemSerializer(srz.Serializer):
+    idempotency_key = srz.CharField(max_length=64)
+    phone = srz.CharField()
+    amount = MoneyField()
+
+
+class TerminalPaymentBatchSerializer(srz.Serializer):
+    payments = TerminalPaymentBatchItemSerializer(many=True, allow_empty=False,
+                                                  max_length=1000)
+
+    @atomic
+    def create(self, validated_data):
+        """
+        Apply queued payments of the terminal in one transaction and return a
+        result per item in the same order: `created`, `duplicate` for a key
+        which is already applied, `not_found` for an unknown phone or
+        `ambiguous` for a phone of several students.
+        """
+        terminal = self.context['request'].terminal
+        # Batches and keyed single payments of the same terminal are applied
+        # one after another, so the keys read below stay applied or free
+        Terminal.objects.select_for_update().get(id=terminal.id)
+        items = validated_data['payments']
+        keys = {item['idempotency_key'] for item in items}
+        applied = dict(Payment.objects.filter(
+            terminal=terminal,
+            idempotency_key__in=keys,
+        ).values_list('idempotency_key', 'id'))
+        students = Student.objects.by_phones({item['phone'] for item in items})
+
+        results = []
+        payments = {}
+        for item in items:
+            key = item['idempotency_key']
+            result = {'idempotency_key': key, 'status': 'created', 'id': None}
+            student = students.get(item['phone'])
+            if key in applied or key in payments:
+                result['status'] = 'duplicate'
+            elif item['phone'] not in students:
+                result['status'] = 'not_found'
+            elif student is None:
+                result['status'] = 'ambiguous'
+            else:
+                payments[key] = Payment(amount=item['amount'], terminal=terminal,
+                                        student=student, idempotency_key=key)
+            results.append(result)
+
+        Payment.objects.bulk_create(payments.values())
+        BalanceEntry.objects.post_many([
+            BalanceEntry(student=payment.student, amount=payment.amount,
+                         kind=BalanceEntryKind.TERMINAL_PAYMENT, payment=payment)
+            for payment in payments.values()
+        ])
+        History.objects.bulk_create([
+            History(
+                student=payment.student,
+                description=f'Студент совершил платеж в размере {payment.amount} сом',
+                manager=terminal.name,
+            )
+            for payment in payments.values()
+        ])
+        applied.update((key, payment.id) for key, payment in payments.items())
+        for result in results:
+            if result['status'] in ('created', 'duplicate'):
+                result['id'] = applied[result['idempotency_key']]
+        return results
+
+    def update(self, instance, validated_data):
+        raise NotImplementedError()
+
+
+class TerminalPaymentBatchResultSerializer(srz.Serializer):
+    idempotency_key = srz.CharField()
+    status = ChoiceField((
+        ('created', 'created'),
+        ('duplicate', 'duplicate'),
+        ('not_found', 'not_found'),
+        ('ambiguous', 'ambiguous'),
+    ))
+    id = srz.IntegerField(allow_null=True)
+
+    def create(self, validated_data):
+        raise NotImplementedError()
 
     def update(self, instance, validated_data):
         raise NotImplementedError()
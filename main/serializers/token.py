@@ -1,8 +1,11 @@
 
 from rest_framework import serializers as srz
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 
 from main.choices import Role
 
+from main.authentication import BranchRefreshToken
 from main.serializers.fields import ChoiceField
 
 
@@ -23,5 +26,9 @@ class TokenRefreshResponseSerializer(srz.Serializer):
      # fullname = srz.CharField()
 
 
+class BranchTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BranchRefreshToken
 
 
+class BranchTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = BranchRefreshToken
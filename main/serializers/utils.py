@@ -1,19 +1,6 @@
-from datetime import timedelta
-
 from django.utils.translation import ngettext
 
 
-def daterange(start, days_type, goal=12):
-    days = []
-    count = 0
-    while len(days) < goal:
-        next_date = start + timedelta(days=count)
-        if next_date.weekday() in days_type:
-            days.append(next_date)
-        count += 1
-    return days
-
-
 def get_description(serializer):
     description = ''
     for field, value in serializer.validated_data.items():
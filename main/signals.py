@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group as AuthGroup
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from main.authentication import clear_user_active
+from main.cache import invalidate_lesson_boards
+from main.cache import invalidate_status_boards
+from main.models import Closure
+from main.models import Group
+from main.matching import clear_matching_indexes
+from main.models import History
+from main.models import Lesson
+from main.models import Student
+from main.models import StudentGroupEnrollment
+from main.models import StudentGroupStatus
+from main.models import Pending
+from main.models import Terminal
+from main.models.users import clear_role_groups
+from main.permissions import clear_terminal_cache
+from main.schedule import clear_closed_dates
+
+
+@receiver(post_save, sender=History)
+def history_saved(sender, instance: History, created, **__):
+    if created and StudentGroupStatus.objects.record([instance]):
+        invalidate_status_boards([(instance.student_id, instance.group_id)])
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance: Student, created, **__):
+    name = instance.get_name()
+    if not created and name != getattr(instance, '_loaded_name', name):
+        invalidate_lesson_boards(Lesson.objects.filter(studentlesson__student=instance))
+    instance._loaded_name = name
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def user_changed(sender, instance, **__):
+    # Sent with the proxy class as sender for teachers and other roles
+    if isinstance(instance, get_user_model()):
+        user_id = instance.pk
+        transaction.on_commit(lambda: clear_user_active(user_id))
+
+
+@receiver(post_save, sender=Closure)
+@receiver(post_delete, sender=Closure)
+def closure_changed(**__):
+    transaction.on_commit(clear_closed_dates)
+
+
+@receiver(post_save, sender=Terminal)
+@receiver(post_delete, sender=Terminal)
+def terminal_changed(**__):
+    transaction.on_commit(clear_terminal_cache)
+
+
+@receiver(post_delete, sender=AuthGroup)
+def auth_group_deleted(**__):
+    transaction.on_commit(clear_role_groups)
+
+
+@receiver(m2m_changed, sender=Group.students.through)
+@receiver(m2m_changed, sender=Group.unsubscribed.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **__):
+    if action == 'pre_clear':
+        field = 'student_id' if reverse else 'group_id'
+        instance._cleared_ids = list(sender.objects.filter(
+            **{field: instance.pk},
+        ).values_list('group_id' if reverse else 'student_id', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        pairs = [(instance.pk, group_id) for group_id in pk_set]
+    else:
+        pairs = [(student_id, instance.pk) for student_id in pk_set]
+    Group.objects.refresh_counts({group_id for _, group_id in pairs})
+    if sender is Group.students.through:
+        StudentGroupEnrollment.objects.refresh(pairs)
+        transaction.on_commit(clear_matching_indexes)
+
+
+@receiver(post_save, sender=Group.unsubscribed.through)
+@receiver(post_delete, sender=Group.unsubscribed.through)
+def unsubscribed_changed(sender, instance, **__):
+    Group.objects.refresh_counts([instance.group_id])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Pending)
+@receiver(post_delete, sender=Pending)
+def matching_changed(**__):
+    transaction.on_commit(clear_matching_indexes)
@@ -1,49 +1,248 @@
+from collections import defaultdict
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from time import monotonic
+
+from celery import chord
 from celery.schedules import crontab
-from django.db.models import Exists, Q
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import Exists
 from django.db.models import OuterRef
+from django.db.models import Q
+from django.utils.timezone import localdate
+from django.utils.timezone import make_aware
 from django.utils.timezone import now
 
+from main.cache import invalidate_status_boards
+from main.matching import clear_matching_indexes
+from main.models import ArchivedLesson
+from main.models import Branch
 from main.models import Group
 from main.models import History
+from main.models import Lesson
+from main.models import StudentGroupEnrollment
+from main.models import StudentGroupStatus
 from main.models import StudentLesson
+from main.schedule import closed_dates
+from main.schedule import lesson_days
 from root.celery import app
 from root.celery import atomic_celery_task
 
 
-@atomic_celery_task(bind=True, name='unsubscribe students')
+logger = get_task_logger(__name__)
+
+
+@app.task(bind=True, name='unsubscribe students')
 def unsubscribe_students(self):
-    current_time = now()
-    groups = Group.objects.all()
-    for group in groups:
-        students = group.students.filter(
-            Exists(StudentLesson.objects.filter(
-                student_id=OuterRef('pk'),
-                lesson__group_id=group.id,
-                student__groups=OuterRef('pk'),
-            )),
-            ~Exists(StudentLesson.objects.filter(
-                Q(lesson__took_place=False) | Q(lesson__took_place__isnull=True),
-                student_id=OuterRef('pk'),
-                lesson__group_id=group.id,
-                lesson__completion_timestamp__lte=current_time,
-                student__groups=OuterRef('pk'),
-            ))
-
-        )
-        histories = []
+    """
+    Unsubscribe students with no lessons left from their groups, one
+    subtask per branch, and report the totals once all of them are done.
+    """
+    branches = list(Branch.objects.values_list('id', flat=True))
+    if not branches:
+        return None
+    header = [unsubscribe_branch_students.s(branch_id) for branch_id in branches]
+    return chord(header)(unsubscribe_report.s(now().isoformat())).id
+
+
+@atomic_celery_task(bind=True, name='unsubscribe branch students')
+def unsubscribe_branch_students(self, branch_id):
+    """
+    Unsubscribe members of the branch groups who have lessons in the group
+    and none of them is still to come. The condition is checked on the
+    lessons themselves, not on the enrollment read model, which is
+    refreshed for these pairs afterwards.
+    """
+    started = monotonic()
+    lessons = StudentLesson.objects.filter(
+        student_id=OuterRef('student_id'),
+        lesson__group_id=OuterRef('group_id'),
+    )
+    pairs = list(Group.students.through.objects.filter(
+        Exists(lessons),
+        ~Exists(lessons.filter(lesson__took_place__isnull=True)),
+        group__branch_id=branch_id,
+        group__archived=False,
+    ).values_list('student_id', 'group_id'))
+
+    if pairs:
+        students = defaultdict(list)
+        for student_id, group_id in pairs:
+            students[group_id].append(student_id)
         description = 'Студент был отписан по причине не остатка уроков в группе'
-        for student in students:
-            histories.append(
-                History(
-                    group=group,
-                    student=student,
-                    description=description,
-                    manager='Система'
-                )
+        histories = History.objects.bulk_create([
+            History(group_id=group_id, student_id=student_id,
+                    description=description, manager='Система')
+            for student_id, group_id in pairs
+        ], 500)
+        StudentGroupStatus.objects.record(histories)
+        invalidate_status_boards(pairs)
+        Group.students.through.objects.filter(reduce(or_, (
+            Q(group_id=group_id, student_id__in=student_ids)
+            for group_id, student_ids in students.items()
+        ))).delete()
+        Group.unsubscribed.through.objects.bulk_create([
+            Group.unsubscribed.through(group_id=group_id, student_id=student_id)
+            for student_id, group_id in pairs
+        ], 500, ignore_conflicts=True)
+        Group.objects.refresh_counts(students)
+        StudentGroupEnrollment.objects.refresh(pairs)
+        transaction.on_commit(clear_matching_indexes)
+
+    return {
+        'branch': branch_id,
+        'groups': len({group_id for _, group_id in pairs}),
+        'students': len(pairs),
+        'seconds': round(monotonic() - started, 3),
+    }
+
+
+@app.task(bind=True, name='unsubscribe students report')
+def unsubscribe_report(self, results, started_at):
+    report = {
+        'branches': len(results),
+        'groups': sum(result['groups'] for result in results),
+        'students': sum(result['students'] for result in results),
+        'seconds': round((now() - datetime.fromisoformat(started_at)).total_seconds(), 3),
+    }
+    logger.info('Unsubscribed %(students)s students from %(groups)s groups '
+                'of %(branches)s branches in %(seconds)ss', report)
+    return report
+
+
+@app.task(bind=True, name='materialize lessons')
+def materialize_lessons(self, weeks=None):
+    """
+    Keep Lesson rows of every active group created `weeks` ahead, so
+    timetable reads and purchases only ever meet existing slots.
+    """
+    weeks = weeks or settings.LESSON_HORIZON_WEEKS
+    current_time = now()
+    today = localdate()
+    horizon = make_aware(datetime.combine(today + timedelta(weeks=weeks), time()))
+    total = 0
+    for branch_id in Branch.objects.values_list('id', flat=True):
+        closed = closed_dates(branch_id)
+        groups = Group.objects.filter(
+            branch_id=branch_id,
+            current_teacher__isnull=False,
+            started_at__isnull=False,
+        ).only('id', 'days_type', 'start_time', 'current_teacher_id')
+        lessons = []
+        for group in groups:
+            start = make_aware(datetime(today.year, today.month, today.day,
+                                        hour=group.start_time))
+            for day in lesson_days(start, group.days, weeks * len(group.days), closed):
+                if current_time < day < horizon:
+                    lessons.append(Lesson(
+                        group_id=group.id,
+                        teacher_id=group.current_teacher_id,
+                        completion_timestamp=day,
+                    ))
+        if not lessons:
+            continue
+        with transaction.atomic():
+            Lesson.objects.insert_free(lessons, 500)
+        existing = set(Lesson.objects.filter(
+            group__branch_id=branch_id,
+            completion_timestamp__gt=current_time,
+            completion_timestamp__lt=horizon,
+        ).values_list('group_id', 'completion_timestamp'))
+        for lesson in lessons:
+            if (lesson.group_id, lesson.completion_timestamp) not in existing:
+                logger.warning('Teacher %s is busy at %s, group %s has no lesson slot',
+                               lesson.teacher_id, lesson.completion_timestamp,
+                               lesson.group_id)
+        total += len(lessons)
+    return total
+
+
+SNAPSHOT_BALANCES_SQL = """
+with latest as (
+    select distinct on (student_id) student_id, balance, last_entry_id
+    from main_balancesnapshot
+    order by student_id, last_entry_id desc
+)
+insert into main_balancesnapshot (student_id, balance, last_entry_id, created_at)
+select entries.student_id,
+       coalesce(latest.balance, 0) + sum(entries.amount),
+       max(entries.id),
+       max(entries.created_at)
+from main_balanceentry entries
+left join latest on latest.student_id = entries.student_id
+where entries.id > coalesce(latest.last_entry_id, 0)
+  and entries.created_at < %s
+group by entries.student_id, latest.balance
+"""
+
+
+@app.task(bind=True, name='snapshot balances')
+def snapshot_balances(self):
+    """
+    Snapshot balances of students with new ledger entries, so a past
+    balance is computed from the entries after the latest snapshot only.
+    Recent entries are left for the next run, their transactions may still
+    be in flight.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(SNAPSHOT_BALANCES_SQL, [now() - timedelta(hours=1)])
+        return cursor.rowcount
+
+
+@app.task(bind=True, name='reconcile group counts')
+def reconcile_group_counts(self):
+    """Fix stored member counts of groups changed without m2m signals."""
+    fixed = Group.objects.refresh_counts()
+    if fixed:
+        clear_matching_indexes()
+        logger.warning('Fixed member counts of %s groups', fixed)
+    return fixed
+
+
+def latest_histories(pairs):
+    """The latest History entry of every (student id, group id) pair."""
+    students = defaultdict(list)
+    for student_id, group_id in pairs:
+        students[group_id].append(student_id)
+    return History.objects.filter(reduce(or_, (
+        Q(group_id=group_id, student_id__in=student_ids)
+        for group_id, student_ids in students.items()
+    ))).order_by('student_id', 'group_id', '-created_at').distinct(
+        'student_id', 'group_id',
+    )
+
+
+@app.task(bind=True, name='archive lessons')
+def archive_lessons(self, months=None, batch_size=None):
+    """
+    Move lessons and student lessons of groups archived more than `months`
+    ago to the archive tables, one committed batch at a time. Enrollments
+    and statuses of the students of every batch are refreshed with it.
+    """
+    months = months or settings.ARCHIVE_AFTER_MONTHS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archived_before = now() - timedelta(days=30 * months)
+    lessons = student_lessons = 0
+    while True:
+        with transaction.atomic():
+            moved, moved_students, pairs = ArchivedLesson.objects.archive(
+                archived_before, batch_size,
             )
-        History.objects.bulk_create(histories, 100)
-        group.students.remove(*students)
-        group.unsubscribed.add(*students, through_defaults={'created_at': now()})
+            if pairs:
+                StudentGroupEnrollment.objects.refresh(pairs)
+                StudentGroupStatus.objects.record(latest_histories(pairs))
+        lessons += moved
+        student_lessons += moved_students
+        if moved < batch_size:
+            break
+    logger.info('Archived %s lessons and %s student lessons', lessons, student_lessons)
+    return {'lessons': lessons, 'student_lessons': student_lessons}
 
 
 @app.on_after_finalize.connect
@@ -53,3 +252,23 @@ def setup_periodic_tasks(sender, **__):
         unsubscribe_students.s(),
         name='unsubscribe students',
     )
+    sender.add_periodic_task(
+        crontab(hour=2, minute=0),
+        materialize_lessons.s(),
+        name='materialize lessons',
+    )
+    sender.add_periodic_task(
+        crontab(hour=3, minute=0),
+        snapshot_balances.s(),
+        name='snapshot balances',
+    )
+    sender.add_periodic_task(
+        crontab(hour=4, minute=0),
+        reconcile_group_counts.s(),
+        name='reconcile group counts',
+    )
+    sender.add_periodic_task(
+        crontab(hour=5, minute=0, day_of_week=0),
+        archive_lessons.s(),
+        name='archive lessons',
+    )
@@ -11,6 +11,7 @@ from ...permissions.exceptions import (
 )
 from ...permissions import (
     IsTerminalAuthenticated,
+    clear_terminal_cache,
 )
 
 
@@ -20,6 +21,7 @@ class TerminalAuthTest(TestCase):
         self.terminal = Terminal.objects.create(name='terminal 1', access_token=1324500091)
         self.request = HttpRequest()
         self.authenticator = IsTerminalAuthenticated()
+        clear_terminal_cache()
 
     def test_auth_token(self):
         self.request.META['HTTP_TERMINAL_AUTHORIZATION'] = jwt.encode({'id': self.terminal.id},
@@ -38,3 +40,22 @@ class TerminalAuthTest(TestCase):
         self.request.META['HTTP_TERMINAL_AUTHORIZATION'] = jwt.encode({'id': self.terminal.id},
                                                                       str(self.terminal.access_token) + '2')
         self.assertRaises(InvalidTokenProvided, self.authenticator.has_permission, self.request, None)
+
+    def authorize(self, token):
+        request = HttpRequest()
+        request.META['HTTP_TERMINAL_AUTHORIZATION'] = token
+        return self.authenticator.has_permission(request, None)
+
+    def test_cached_auth_has_no_queries(self):
+        token = jwt.encode({'id': self.terminal.id}, str(self.terminal.access_token))
+        self.assertTrue(self.authorize(token))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.authorize(token))
+
+    def test_terminal_change_drops_cached_token(self):
+        token = jwt.encode({'id': self.terminal.id}, str(self.terminal.access_token))
+        self.assertTrue(self.authorize(token))
+        self.terminal.access_token += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.terminal.save()
+        self.assertRaises(InvalidTokenProvided, self.authorize, token)
@@ -0,0 +1,36 @@
+from datetime import date
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from main.availability import AvailabilityIndex
+from main.availability import SLOT_TIMES
+from main.availability import slot_bit
+
+
+class AvailabilityIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.teachers = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+        busy = {1: slot_bit(0, 9) | slot_bit(1, 14), 2: 0}
+        self.index = AvailabilityIndex(self.teachers, busy)
+
+    def test_free_teachers(self):
+        self.assertEqual(self.index.free_teachers(0, 9), [self.teachers[1]])
+        # Any non-zero days type means Tue/Thu/Sat, like Group.days
+        self.assertEqual(self.index.free_teachers(3, 14), [self.teachers[1]])
+        self.assertEqual(self.index.free_teachers(0, 14), self.teachers)
+
+    def test_free_slots(self):
+        slots = self.index.free_slots(1)
+        self.assertEqual(len(slots), 2 * len(SLOT_TIMES) - 2)
+        self.assertNotIn((0, 9), slots)
+        self.assertNotIn((1, 14), slots)
+
+    def test_free_slots_of_date(self):
+        self.index.day = date(2023, 3, 7)  # Tuesday
+        slots = self.index.free_slots(1)
+        self.assertEqual(len(slots), len(SLOT_TIMES) - 1)
+        self.assertTrue(all(days_type == 1 for days_type, _ in slots))
+        self.index.day = date(2023, 3, 12)  # Sunday
+        self.assertEqual(self.index.free_slots(1), [])
@@ -0,0 +1,82 @@
+from datetime import date
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils.timezone import now
+
+from main.choices import Day
+from main.choices import EnrollmentState
+from main.choices import Plan as PlanChoice
+from main.choices import Promoter
+from main.choices import Role
+from main.models import Branch
+from main.models import Group
+from main.models import Lesson
+from main.models import Plan
+from main.models import Student
+from main.models import StudentGroupEnrollment
+from main.models import StudentLesson
+from main.models import Subject
+from main.models import Teacher
+
+
+class EnrollmentRefreshTest(TestCase):
+
+    def setUp(self):
+        branch = Branch.objects.create(name='branch 1', address='address 1')
+        self.teacher = Teacher.objects.create(
+            phone='+996700000001', fullname='teacher 1', birth_day=date(1990, 1, 1),
+            role=Role.TEACHER, inn='1', address='address 1', branch=branch,
+        )
+        self.group = Group.objects.create(
+            name='group 1', branch=branch, subject=Subject.objects.create(title='subject 1'),
+            max_student_count=10, days_type=Day.Mon, start_time=9,
+            current_teacher=self.teacher,
+        )
+        self.student = Student.objects.create(
+            phone='+996700000002', first_name='first', last_name='last',
+            birth_day=date(2000, 1, 1), branch=branch, promoter=Promoter.FRIEND,
+        )
+        self.group.students.add(self.student)
+        self.trial = Plan.objects.create(id=PlanChoice.TRIAL, name='trial', batch_price=0,
+                                         single_price=0, max_student_count=10)
+        self.plan = Plan.objects.create(id=3, name='plan 1', batch_price=1200,
+                                        single_price=100, max_student_count=10)
+
+    def add_lesson(self, days, plan, took_place=None):
+        lesson = Lesson.objects.create(
+            group=self.group, teacher=self.teacher, took_place=took_place,
+            completion_timestamp=now() + timedelta(days=days),
+        )
+        StudentLesson.objects.create(student=self.student, lesson=lesson, plan=plan,
+                                     lesson_price=plan.single_price)
+        return lesson
+
+    def get_enrollment(self):
+        StudentGroupEnrollment.objects.refresh([(self.student.id, self.group.id)])
+        return StudentGroupEnrollment.objects.get(student=self.student, group=self.group)
+
+    def test_cancelled_lesson_is_not_remaining(self):
+        self.add_lesson(-2, self.plan, took_place=True)
+        self.add_lesson(-1, self.plan, took_place=False)
+        upcoming = self.add_lesson(1, self.plan)
+
+        enrollment = self.get_enrollment()
+        self.assertEqual(enrollment.total_lessons, 3)
+        self.assertEqual(enrollment.remaining_lessons, 1)
+        self.assertEqual(enrollment.remaining_value, 100)
+        self.assertEqual(enrollment.state, EnrollmentState.ACTIVE)
+
+        Lesson.objects.filter(id=upcoming.id).update(took_place=False)
+        enrollment = self.get_enrollment()
+        self.assertEqual(enrollment.remaining_lessons, 0)
+        self.assertEqual(enrollment.remaining_value, 0)
+        self.assertEqual(enrollment.state, EnrollmentState.COMPLETED)
+
+    def test_cancelled_trial_is_not_pending(self):
+        self.add_lesson(-1, self.trial, took_place=False)
+        self.add_lesson(1, self.plan)
+        self.assertEqual(self.get_enrollment().state, EnrollmentState.ACTIVE)
+
+        self.add_lesson(2, self.trial)
+        self.assertEqual(self.get_enrollment().state, EnrollmentState.TRIAL)
@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+from rest_framework import serializers as srz
+
+from main.serializers.loaders import Loader
+from main.serializers.loaders import LoaderListSerializer
+
+
+class LoaderTest(SimpleTestCase):
+
+    def setUp(self):
+        self.batches = []
+
+        def batch(keys, context):
+            self.batches.append(set(keys))
+            return {key: key * 10 for key in keys if key > 0}
+
+        self.loader = Loader(batch, {})
+
+    def test_primed_keys_are_loaded_together(self):
+        self.loader.prime([1, 2, 3])
+        self.assertEqual(self.loader.load(2), 20)
+        self.assertEqual(self.loader.load(3), 30)
+        self.assertEqual(self.batches, [{1, 2, 3}])
+
+    def test_missing_keys_are_not_loaded_again(self):
+        self.loader.prime([-1, 1])
+        self.assertIsNone(self.loader.load(-1))
+        self.assertIsNone(self.loader.load(-1))
+        self.loader.prime([-1, 1, 4])
+        self.assertEqual(self.loader.load(4), 40)
+        self.assertEqual(self.batches, [{-1, 1}, {4}])
+
+
+class LoaderListSerializerTest(SimpleTestCase):
+
+    def test_items_are_primed_before_serialized(self):
+        calls = []
+
+        class ItemSrz(srz.Serializer):
+            class Meta:
+                list_serializer_class = LoaderListSerializer
+
+            def prime(self, instance):
+                calls.append(('prime', instance))
+
+            def to_representation(self, instance):
+                calls.append(('serialize', instance))
+                return instance
+
+        self.assertEqual(ItemSrz([1, 2], many=True).data, [1, 2])
+        self.assertEqual(calls, [('prime', 1), ('prime', 2),
+                                 ('serialize', 1), ('serialize', 2)])
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from main.matching import GroupEntry
+from main.matching import MatchingIndex
+from main.matching import PendingEntry
+
+
+class MatchingIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.groups = [
+            # id, subject, level, days type, start time, teacher, free places
+            GroupEntry(1, 1, 'A1', 0, 9, 10, 3),
+            GroupEntry(2, 1, 'a1 ', 1, 9, 10, 1),
+            GroupEntry(3, 1, 'A1', 0, 9, 10, 0),
+            GroupEntry(4, 2, 'A1', 0, 9, 10, 5),
+            GroupEntry(5, 1, 'B2', 0, 14, 11, 5),
+        ]
+        self.pendings = [
+            # id, subject, level, days type, start time, teacher, created at
+            PendingEntry(1, 1, 'A1', 2, None, None, datetime(2024, 1, 2)),
+            PendingEntry(2, 1, 'B2', 0, 14, 11, datetime(2024, 1, 3)),
+            PendingEntry(3, 1, 'A1', 0, 9, 10, datetime(2024, 1, 1)),
+        ]
+        self.index = MatchingIndex(self.groups, self.pendings)
+
+    def test_groups_for(self):
+        matches = self.index.groups_for(1)
+        # Full groups and groups of other subjects are never offered,
+        # Wednesday falls on the same days pattern as group 2
+        self.assertEqual([group.id for _, group in matches], [2, 1, 5])
+        self.assertEqual([score for score, _ in matches], [10, 6, 5])
+        self.assertEqual(len(self.index.groups_for(1, 1)), 1)
+        self.assertEqual(self.index.groups_for(404), [])
+
+    def test_pendings_for(self):
+        matches = self.index.pendings_for(1)
+        self.assertEqual([pending.id for _, pending in matches], [3, 1, 2])
+        self.assertEqual([score for score, _ in matches], [10, 6, 4])
+        self.assertEqual(self.index.pendings_for(3), [])
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from main.pagination import EnrollmentPagination
+
+
+class EnrollmentPaginationTest(SimpleTestCase):
+
+    def paginate(self, items, **query):
+        request = Request(APIRequestFactory().get('/api/groups/trials/', query))
+        paginator = EnrollmentPagination()
+        return paginator.paginate_queryset(items, request), paginator
+
+    def test_page_boundary(self):
+        items = list(range(101))
+        page, paginator = self.paginate(items)
+        self.assertEqual(page, items[:50])
+        self.assertIsNotNone(paginator.get_next_link())
+
+        page, paginator = self.paginate(items, page=2)
+        self.assertEqual(page, items[50:100])
+        self.assertIsNotNone(paginator.get_next_link())
+
+        page, paginator = self.paginate(items, page=3)
+        self.assertEqual(page, [100])
+        self.assertIsNone(paginator.get_next_link())
+
+    def test_page_size_is_capped(self):
+        page, _ = self.paginate(list(range(300)), page_size=1000)
+        self.assertEqual(len(page), 200)
@@ -0,0 +1,47 @@
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+
+from main.schedule import lesson_days
+
+
+def brute_force(start, weekdays, goal, closed=frozenset()):
+    days = []
+    count = 0
+    while len(days) < goal:
+        next_date = start + timedelta(days=count)
+        if next_date.weekday() in weekdays and next_date.date() not in closed:
+            days.append(next_date)
+        count += 1
+    return days
+
+
+class LessonDaysTest(SimpleTestCase):
+
+    def test_matches_day_by_day_walk(self):
+        for weekdays in ([0, 2, 4], [1, 3, 5]):
+            for shift in range(7):
+                start = datetime(2023, 2, 6, 9) + timedelta(days=shift)
+                for count in (1, 2, 3, 12, 144):
+                    self.assertEqual(lesson_days(start, weekdays, count),
+                                     brute_force(start, weekdays, count))
+
+    def test_matches_day_by_day_walk_with_closed_dates(self):
+        start = datetime(2023, 2, 7, 9)
+        closed = {date(2023, 2, 1), date(2023, 2, 7), date(2023, 2, 11),
+                  date(2023, 2, 13), date(2023, 2, 15), date(2023, 5, 1)}
+        for weekdays in ([0, 2, 4], [1, 3, 5]):
+            for count in (1, 2, 3, 12, 144):
+                self.assertEqual(lesson_days(start, weekdays, count, closed),
+                                 brute_force(start, weekdays, count, closed))
+
+    def test_skips_closed_dates(self):
+        start = datetime(2023, 3, 6, 14)
+        closed = {date(2023, 3, 8), date(2023, 3, 13)}
+        days = lesson_days(start, [0, 2, 4], 4, closed)
+        self.assertEqual([day.date() for day in days], [
+            date(2023, 3, 6), date(2023, 3, 10), date(2023, 3, 15), date(2023, 3, 17),
+        ])
+        self.assertTrue(all(day.hour == 14 for day in days))
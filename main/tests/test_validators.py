@@ -0,0 +1,15 @@
+from django.test import SimpleTestCase
+
+from main.validators import normalize_phone
+
+
+class NormalizePhoneTest(SimpleTestCase):
+
+    def test_canonical_form(self):
+        for phone in ('996555123456', '+996 555 123 456', '0555 12-34-56',
+                      '555123456', '00996555123456', '(0555) 123 456'):
+            self.assertEqual(normalize_phone(phone), '996555123456', phone)
+
+    def test_unknown_formats_keep_digits(self):
+        self.assertEqual(normalize_phone('+7 701 123 45 67'), '77011234567')
+        self.assertEqual(normalize_phone(None), '')
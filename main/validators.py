@@ -1,6 +1,24 @@
+import re
+
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 
 
 phone_regex_kg = RegexValidator(regex=r'^996\d{9}$',
                                 message=_('Phone number must be in the format: 996XXX123456.'))
+
+
+def normalize_phone(phone) -> str:
+    """
+    Bring a Kyrgyz phone number to the 996XXXXXXXXX form used by Student.phone.
+    Spaces, dashes, brackets, a leading + or 00 and the local 0 prefix are
+    accepted. Anything else is returned as bare digits.
+    """
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if len(digits) == 10 and digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) == 9:
+        digits = '996' + digits
+    return digits
@@ -1,5 +1,6 @@
 from django.db.models import Case
 from django.db.models import CharField
+from django.db.models import Exists
 from django.db.models import OuterRef
 from django.db.models import Prefetch
 from django.db.models import Q
@@ -7,6 +8,8 @@ from django.db.models import Subquery
 from django.db.models import Value
 from django.db.models import When
 from django.db.transaction import atomic
+from django.http import StreamingHttpResponse
+from django.utils.timezone import localtime
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
@@ -18,10 +21,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 
+from .. import exports
 from .. import filters
 from .. import models
 from .. import permissions as perm
 from .. import serializers as srz
+from ..cache import get_board
+from ..cache import invalidate_boards
+from ..pagination import AttendanceKeysetPagination
 
 
 class AttendanceViewSet(ViewSetMixin,
@@ -32,23 +39,70 @@ class AttendanceViewSet(ViewSetMixin,
     filter_backends = DjangoFilterBackend,
     filterset_class = filters.AttendanceFilter
 
+    export_renderers = {
+        'csv': ('text/csv; charset=utf-8', exports.render_csv),
+        'ndjson': ('application/x-ndjson; charset=utf-8', exports.render_ndjson),
+    }
+
     srz_map = {
         'took_place': srz.TookPlaceSrz,
+        'roll_call': srz.RollCallSrz,
+        'cancel_date': srz.CancelDateSrz,
     }
 
     def get_serializer_class(self):
         return self.srz_map.get(self.action) or srz.AttendanceSerializer
 
+    def get_permissions(self):
+        perms = super().get_permissions()
+        if self.action == 'cancel_date':
+            perms.append(perm.IsManager())
+        return perms
+
+    def list(self, request, *args, **kwargs):
+        day = self.get_board_day()
+        if day is None:
+            return super().list(request, *args, **kwargs)
+        data = get_board(
+            request.user.branch_id, day, request.query_params,
+            lambda: super(AttendanceViewSet, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data)
+
+    def get_board_day(self):
+        """Date of the requested board when the filters stay within one day."""
+        filterset = self.filterset_class(
+            self.request.query_params,
+            queryset=models.Lesson.objects.none(),
+            request=self.request,
+        )
+        if not filterset.is_valid():
+            return None
+        cleaned_data = filterset.form.cleaned_data
+        bounds = cleaned_data.get('completion_timestamp__range') or (
+            cleaned_data.get('completion_timestamp__gte'),
+            cleaned_data.get('completion_timestamp__lte'),
+        )
+        if not all(bounds):
+            return None
+        start, end = (localtime(bound).date() for bound in bounds)
+        return start if start == end else None
+
     def get_queryset(self):
         if self.action == 'took_place':
             return models.Lesson.objects
-        qs = models.Lesson.objects.filter(
+        if self.action == 'roll_call':
+            return models.Lesson.objects.filter(
+                group__branch_id=self.request.user.branch_id,
+            ).select_for_update(of=('self',))
+        lessons = models.Lesson.objects.filter(
+            Exists(models.StudentLesson.objects.filter(lesson_id=OuterRef('pk'))),
             group__started_at__isnull=False,
-            group__branch=self.request.user.branch,
-        ).order_by(
-            'id',
-            'studentlesson__id',
-        ).prefetch_related(
+            group__branch_id=self.request.user.branch_id,
+        )
+        if self.action == 'export':
+            return lessons
+        qs = lessons.prefetch_related(
             Prefetch('studentlesson_set',
                      models.StudentLesson.objects.annotate(
                          badge=Case(
@@ -58,7 +112,7 @@ class AttendanceViewSet(ViewSetMixin,
                              output_field=CharField(max_length=10),
                          ),
                          status=Subquery(
-                             models.History.objects.filter(
+                             models.StudentGroupStatus.objects.filter(
                                  group_id=OuterRef('lesson__group_id'),
                                  student_id=OuterRef('student_id'),
                              ).values('description')[:1],
@@ -78,7 +132,38 @@ class AttendanceViewSet(ViewSetMixin,
         #         student_lessons.update(absence_reason_id=paused_reason.id)
         # except models.AbsenceReason.DoesNotExist:
         #     pass
-        return qs.distinct('id')
+        if self.action == 'feed':
+            # ordering is applied by the keyset paginator
+            return qs.distinct()
+        return qs.order_by(
+            'id',
+            'studentlesson__id',
+        ).distinct('id')
+
+    @action(['get'], False, 'feed', pagination_class=AttendanceKeysetPagination)
+    def feed(self, *_a, **__):
+        qs = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(qs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(['get'], False, 'export')
+    def export(self, *_a, **__):
+        export_type = self.request.query_params.get('type', 'csv')
+        if export_type not in self.export_renderers:
+            raise srz.ValidationError({
+                'type': [_('Unsupported export type, use one of: %(types)s') % {
+                    'types': ', '.join(self.export_renderers),
+                }]
+            })
+        content_type, render = self.export_renderers[export_type]
+        lessons = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            render(exports.attendance_rows(lessons)),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="attendance.{export_type}"'
+        return response
 
     @action(['put'], True, 'took-place')
     @atomic
@@ -88,21 +173,49 @@ class AttendanceViewSet(ViewSetMixin,
         serializer = self.get_serializer(lesson, self.request.data)
         serializer.is_valid(raise_exception=True)
         instance = serializer.save(took_place=True)
-        if teacher := serializer.validated_data.get('teacher'):
+        self.write_took_place_history(lesson, instance, serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+    @action(['put'], True, 'roll-call')
+    @atomic
+    def roll_call(self, *args, **kwargs):
+        lesson = self.get_object()
+
+        serializer = self.get_serializer(lesson, self.request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save()
+        self.write_took_place_history(lesson, instance, serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+    @action(['put'], False, 'cancel-date')
+    def cancel_date(self, *args, **kwargs):
+        serializer = self.get_serializer(
+            data=self.request.data,
+            context={
+                'request': self.request,
+                'branch_id': self.request.user.branch_id,
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.cancel(), status=status.HTTP_200_OK)
+
+    def write_took_place_history(self, lesson, instance, validated_data):
+        invalidate_boards(self.request.user.branch_id, [lesson.completion_timestamp])
+        models.StudentGroupEnrollment.objects.refresh_lessons([lesson.id])
+        if teacher := validated_data.get('teacher'):
             models.TeacherHistory.objects.create(
                 group=lesson.group,
                 manager=self.request.user.fullname,
                 teacher=teacher,
                 description=f'Подмена учителя со стороны: {teacher.fullname}'
             )
-        took_place = serializer.validated_data['took_place']
+        took_place = validated_data['took_place']
         if took_place is False:
             comment = f'Отмена урока'
-            if cm := serializer.validated_data.get('comment'):
+            if cm := validated_data.get('comment'):
                 models.TeacherHistory.objects.create(
                     group=lesson.group,
                     manager=self.request.user.fullname,
                     teacher_id=instance.teacher_id,
                     description=comment + f', комментарий: {cm}'
                 )
-        return Response(status=status.HTTP_200_OK)
@@ -1,5 +1,6 @@
 from django.db.models import Count, Prefetch, Q, OuterRef, Exists
 from django.db.transaction import atomic
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from rest_framework import mixins, status
 from rest_framework.decorators import action
@@ -12,6 +13,10 @@ from main import filters
 from main import models
 from main import permissions as perm
 from main import serializers as srz
+from main.cache import invalidate_lesson_boards
+from main.choices import EnrollmentState
+from main.matching import matching_index
+from main.pagination import EnrollmentPagination
 
 
 class GroupViewSet(ViewSetMixin,
@@ -28,12 +33,14 @@ class GroupViewSet(ViewSetMixin,
         'archived': srz.GroupListSrz,
         'create': srz.GroupCreateSrz,
         'list': srz.GroupListSrz,
-        'with_no_lesson': srz.GroupWithNoLessonSrz,
-        'completed': srz.GroupCompletedSrz,
+        'with_no_lesson': srz.GroupStudentSrz,
+        'completed': srz.GroupStudentSrz,
         'retrieve': srz.GroupDetailSerializer,
-        'trials': srz.GroupTrialsSrz,
+        'trials': srz.GroupStudentSrz,
         'change_teacher': srz.GroupChangeTeacherSrz,
         'change_level': srz.GroupChangeLevelSrz,
+        'reschedule': srz.GroupRescheduleSrz,
+        'pendings': srz.MatchQuerySrz,
         'sell_book': srz.GroupSellBook,
         'update': srz.GroupUpdateSrz,
     }
@@ -44,16 +51,8 @@ class GroupViewSet(ViewSetMixin,
 
     def get_queryset(self):
         branch_id = self.request.user.branch_id
-        qs = models.Group.objects.filter(
-            branch_id=branch_id,
-        ).annotate(
-            student_count=Count('students'),
-        )
-        all_qs = models.Group.all_objects.filter(
-            branch_id=branch_id,
-        ).annotate(
-            student_count=Count('students'),
-        )
+        qs = models.Group.objects.filter(branch_id=branch_id)
+        all_qs = models.Group.all_objects.filter(branch_id=branch_id)
 
         if self.action == 'no_lesson':
             qs = qs.annotate(
@@ -69,66 +68,13 @@ class GroupViewSet(ViewSetMixin,
                         'students',
                         models.Student.objects.all(),
                     ),
-                    Prefetch(
-                        'students',
-                        models.Student.objects.filter(
-                            Exists(models.StudentLesson.objects.filter(
-                                student_id=OuterRef('pk'),
-                            )),
-                            ~Exists(models.StudentLesson.objects.filter(
-                                Q(
-                                    lesson__took_place=False,
-                                    lesson__took_place__isnull=True,
-                                ),
-                                student_id=OuterRef('pk'),
-                            ))
-                        ),
-                        'completed',
-                    ),
                     'unsubscribed',
                 ).select_related('book')
-            case 'trials':
-                qs = qs.filter(
-                    lesson__studentlesson__plan_id=1,
-                    lesson__took_place=False,
-                ).distinct()
-            case 'with_no_lesson':
-                qs = qs.distinct().filter(
-                    ~Exists(models.StudentLesson.objects.filter(
-                        lesson__group_id=OuterRef('pk'),
-                    )),
-                    Exists(models.Student.objects.filter(groups=OuterRef('pk')))
-                ).prefetch_related(
-                    Prefetch(
-                        'students',
-                        models.Student.objects.filter(
-                            ~Exists(models.StudentLesson.objects.filter(
-                                student_id=OuterRef('pk'),
-                                lesson__group_id=OuterRef(OuterRef('pk'))
-                            )
-                            )
-                        ),
-                    ),
-                )
-            case 'completed':
-                qs = qs.filter(
-                    ~Exists(models.StudentLesson.objects.filter(
-                        Q(lesson__took_place=False) | Q(lesson__took_place__isnull=True),
-                        lesson__group_id=OuterRef('pk'),
-                        lesson__took_place=False,
-                    )),
-                    Exists(models.StudentLesson.objects.filter(
-                        lesson__group_id=OuterRef('pk'),
-                        lesson__took_place=True,
-                        student__groups=OuterRef('pk'),
-                    )),
-                )
             case 'archived':
                 qs = models.Group.all_objects.filter(
                     branch_id=branch_id,
                     archived=True,
                 ).annotate(
-                    student_count=Count('students'),
                     no_lesson=Count('students', Q(students__studentlesson__isnull=True)),
                 )
 
@@ -164,6 +110,34 @@ class GroupViewSet(ViewSetMixin,
             description=serializer.validated_data.get('comment'),
         )
         serializer.save()
+        invalidate_lesson_boards(models.Lesson.objects.filter(group=serializer.instance))
+
+    def enrollments(self, state):
+        """
+        Page of the students of the filtered groups whose enrollment is in
+        `state`, see EnrollmentPagination.
+        """
+        qs = models.StudentGroupEnrollment.objects.filter(
+            group__in=self.filter_queryset(self.get_queryset()),
+            state=state,
+        ).select_related('group__subject', 'student').order_by(
+            'group__start_time', 'group_id', 'student_id',
+        )
+        page = self.paginate_queryset(qs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def drop_empty_lessons(self, group):
+        """
+        Remove future lesson slots nobody has bought yet. The lesson generator
+        creates them again with the current state of the group.
+        """
+        models.Lesson.objects.filter(
+            ~Exists(models.StudentLesson.objects.filter(lesson_id=OuterRef('pk'))),
+            group=group,
+            took_place__isnull=True,
+            completion_timestamp__gt=now(),
+        ).delete()
 
     @action(['put'], True, 'sell-book')
     def sell_book(self, *args, **__):
@@ -198,6 +172,8 @@ class GroupViewSet(ViewSetMixin,
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        invalidate_lesson_boards(models.Lesson.objects.filter(group=group))
+        self.drop_empty_lessons(group)
         teacher = serializer.validated_data['current_teacher']
         models.History.objects.create(
             group=group,
@@ -212,6 +188,44 @@ class GroupViewSet(ViewSetMixin,
         )
         return Response()
 
+    @action(['put'], True, 'reschedule')
+    @atomic
+    def reschedule(self, *args, **__):
+        group = self.get_object()
+        serializer = self.get_serializer(
+            data=self.request.data,
+            context={'request': self.request, 'group': group},
+        )
+        serializer.is_valid(raise_exception=True)
+        moved = serializer.reschedule()
+        models.History.objects.create(
+            group=group,
+            manager=self.request.user.fullname,
+            description=f'Расписание группы изменено на {group.get_days} '
+                        f'{group.get_time}, перенесено уроков: {moved}',
+            comment=serializer.validated_data.get('comment'),
+        )
+        return Response({'moved': moved})
+
+    @action(['get'], True, 'pendings')
+    def pendings(self, *_, **__):
+        """Pending students of the group subject, best fitting first."""
+        query = self.get_serializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        group = self.get_object()
+        matches = matching_index(self.request.user.branch_id).pendings_for(
+            group.id, query.validated_data['limit'],
+        )
+        pendings = models.Pending.objects.select_related(
+            'subject', 'student', 'teacher',
+        ).in_bulk([pending.id for _, pending in matches])
+        result = []
+        for score, match in matches:
+            if pending := pendings.get(match.id):
+                pending.score = score
+                result.append(pending)
+        return Response(srz.PendingMatchSrz(result, many=True).data)
+
     @action(['put'], True, 'change-level')
     @atomic
     def change_level(self, *args, **__):
@@ -230,15 +244,10 @@ class GroupViewSet(ViewSetMixin,
         )
         return Response()
 
-    @action(['get'], False, 'trials')
+    @action(['get'], False, 'trials', pagination_class=EnrollmentPagination)
     def trials(self, *_, **__):
-        qs = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(instance=qs, many=True)
-        flattened_result = []
-        for group in serializer.data:
-            for student in group.pop('students', []):
-                flattened_result.append({**group, **student})
-        return Response(data=flattened_result)
+        """Students with a trial lesson not held yet (took_place is null)."""
+        return self.enrollments(EnrollmentState.TRIAL)
 
     @action(['get'], True, 'archive')
     @atomic
@@ -249,7 +258,10 @@ class GroupViewSet(ViewSetMixin,
                 'detail': _('Can not archive group which has active lessons'),
             }, status.HTTP_400_BAD_REQUEST)
         group.archived = True
+        group.archived_at = now()
         group.save()
+        invalidate_lesson_boards(models.Lesson.objects.filter(group=group))
+        self.drop_empty_lessons(group)
         models.History.objects.create(
             group=group,
             manager=self.request.user.fullname,
@@ -263,22 +275,10 @@ class GroupViewSet(ViewSetMixin,
         serializer = self.get_serializer(instance=qs, many=True)
         return Response(data=serializer.data)
 
-    @action(['get'], False, 'with-no-lesson')
+    @action(['get'], False, 'with-no-lesson', pagination_class=EnrollmentPagination)
     def with_no_lesson(self, *_, **__):
-        qs = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(instance=qs, many=True)
-        flattened_result = []
-        for group in serializer.data:
-            for student in group.pop('students', []):
-                flattened_result.append({**group, **student})
-        return Response(data=flattened_result)
+        return self.enrollments(EnrollmentState.NO_LESSON)
 
-    @action(['get'], False, 'completed')
+    @action(['get'], False, 'completed', pagination_class=EnrollmentPagination)
     def completed(self, *_, **__):
-        qs = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(instance=qs, many=True)
-        flattened_result = []
-        for group in serializer.data:
-            for student in group.pop('students', []):
-                flattened_result.append({**group, **student})
-        return Response(data=flattened_result)
+        return self.enrollments(EnrollmentState.COMPLETED)
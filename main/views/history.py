@@ -31,8 +31,8 @@ class HistoryViewSet(
 
     def get_queryset(self):
         qs = History.objects.filter(
-            Q(group__branch=self.request.user.branch) |
-            Q(student__branch=self.request.user.branch)
+            Q(group__branch_id=self.request.user.branch_id) |
+            Q(student__branch_id=self.request.user.branch_id)
         )
         return qs
 
@@ -51,7 +51,7 @@ class TeacherHistoryViewSet(
 
     def get_queryset(self):
         qs = TeacherHistory.objects.filter(
-            Q(group__branch=self.request.user.branch) |
-            Q(teacher__branch=self.request.user.branch)
+            Q(group__branch_id=self.request.user.branch_id) |
+            Q(teacher__branch_id=self.request.user.branch_id)
         )
         return qs
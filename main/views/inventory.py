@@ -27,7 +27,7 @@ class InventoryViewSet(
         return self.srz_map.get(self.action, srz.InventoryListSrz)
 
     def get_queryset(self):
-        return models.Inventory.objects.filter(responsible=self.request.user)
+        return models.Inventory.objects.filter(responsible_id=self.request.user.id)
 
 
 class BookViewSet(
@@ -49,4 +49,4 @@ class BookViewSet(
         return self.srz_map.get(self.action, srz.BookListSrz)
 
     def get_queryset(self):
-        return models.Book.objects.filter(branch=self.request.user.branch)
+        return models.Book.objects.filter(branch_id=self.request.user.branch_id)
@@ -1,6 +1,7 @@
 from django.db.models import Q
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, status
+from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -10,6 +11,7 @@ from .. import filters
 from .. import models
 from .. import permissions as perm
 from .. import serializers as srz
+from ..matching import matching_index
 
 
 class PendingViewSet(
@@ -34,6 +36,7 @@ class PendingViewSet(
     srz_map = {
         'create': srz.PendingCreateSrz,
         'list': srz.PendingListSrz,
+        'groups': srz.MatchQuerySrz,
     }
 
     def get_serializer_class(self):
@@ -51,3 +54,24 @@ class PendingViewSet(
         serializer = srz.PendingListSrz(serializer.instance)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(['get'], True, 'groups')
+    def groups(self, *_, **__):
+        """Groups with free places of the pending subject, best fitting first."""
+        query = self.get_serializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        pending = self.get_object()
+        matches = matching_index(self.request.user.branch_id).groups_for(
+            pending.id, query.validated_data['limit'],
+        )
+        groups = models.Group.objects.select_related(
+            'subject', 'current_teacher',
+        ).in_bulk([group.id for _, group in matches])
+        result = []
+        for score, match in matches:
+            if group := groups.get(match.id):
+                group.score = score
+                result.append(group)
+        return Response(srz.GroupMatchSrz(
+            result, many=True, context=self.get_serializer_context(),
+        ).data)
@@ -98,7 +98,7 @@ class StudentViewSet(ViewSetMixin,
         curator = request.user
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        student = serializer.save(curator=curator, branch_id=curator.branch_id)
+        student = serializer.save(curator_id=curator.id, branch_id=curator.branch_id)
         History.objects.create(
             student=student,
             manager=curator.fullname,
@@ -1,13 +1,16 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins
+from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 
 from .. import filters
 from .. import models
 from .. import permissions as perm
 from .. import serializers as srz
+from ..cache import invalidate_boards
 
 
 class StudentLessonViewSet(ViewSetMixin,
@@ -23,6 +26,7 @@ class StudentLessonViewSet(ViewSetMixin,
         'update': srz.StudentLessonAttendanceSrz,
         'partial_update': srz.StudentLessonAttendanceSrz,
         'list': srz.StudentLessonListSrz,
+        'archive': srz.ArchivedStudentLessonListSrz,
     }
 
     def get_serializer_class(self):
@@ -39,3 +43,26 @@ class StudentLessonViewSet(ViewSetMixin,
         #     )
 
         return qs
+
+    @action(['get'], False, 'archive')
+    def archive(self, *_, **__):
+        """Student lessons of long archived groups, see the 'archive lessons' task."""
+        qs = models.ArchivedStudentLesson.objects.filter(
+            student__branch_id=self.request.user.branch_id,
+        ).select_related('student', 'lesson', 'absence_reason')
+        filterset = filters.ArchivedStudentLessonFilter(self.request.query_params, qs,
+                                                        request=self.request)
+        if not filterset.is_valid():
+            raise srz.ValidationError(filterset.errors)
+        serializer = self.get_serializer(filterset.qs, many=True)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        instance = serializer.save()
+        invalidate_boards(
+            self.request.user.branch_id,
+            [instance.lesson.completion_timestamp],
+        )
+        models.StudentGroupEnrollment.objects.refresh([
+            (instance.student_id, instance.lesson.group_id),
+        ])
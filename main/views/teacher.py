@@ -1,4 +1,4 @@
-from django.db.models import Prefetch, Count
+from django.db.models import Prefetch
 from django.db.transaction import atomic
 from django.utils.translation import gettext_lazy as _
 from rest_framework import mixins, status
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 
 from .. import filters
+from ..availability import AvailabilityIndex
 from .. import models
 from .. import permissions as perm
 from .. import serializers as srz
@@ -30,6 +31,8 @@ class TeacherViewSet(ViewSetMixin,
     srz_map = {
         'retrieve': srz.TeacherDetailSrz,
         'fire': srz.TeacherFireSrz,
+        'free': srz.TeacherFreeQuerySrz,
+        'free_slots': srz.TeacherFreeSlotsQuerySrz,
     }
 
     def get_serializer_class(self):
@@ -51,9 +54,7 @@ class TeacherViewSet(ViewSetMixin,
             return qs.prefetch_related(
                 Prefetch(
                     'group_set',
-                    models.Group.objects.annotate(
-                        student_count=Count('students'),
-                    ).order_by('start_time'),
+                    models.Group.objects.order_by('start_time'),
                 )
             )
         return qs
@@ -88,7 +89,7 @@ class TeacherViewSet(ViewSetMixin,
     def hire(self, *_, **__):
         teacher = self.get_object()
         teacher.is_fired = False
-        teacher.save()
+        teacher.save(update_fields=['is_fired'])
         models.TeacherHistory.objects.create(
             teacher=teacher,
             manager=self.request.user.fullname,
@@ -116,7 +117,7 @@ class TeacherViewSet(ViewSetMixin,
                 status.HTTP_400_BAD_REQUEST,
             )
         teacher.is_fired = True
-        teacher.save()
+        teacher.save(update_fields=['is_fired'])
         models.TeacherHistory.objects.create(
             teacher=teacher,
             manager=self.request.user.fullname,
@@ -130,3 +131,34 @@ class TeacherViewSet(ViewSetMixin,
         qs = self.filter_queryset(self.get_queryset()).filter(is_fired=True)
         serializer = self.get_serializer(instance=qs, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(['get'], False, 'free')
+    def free(self, *_a, **__):
+        """Teachers of the branch having no lesson at the given slot."""
+        query = self.get_serializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        index = AvailabilityIndex.for_branch(
+            self.request.user.branch_id,
+            query.validated_data.get('date'),
+        )
+        teachers = index.free_teachers(
+            query.validated_data['days_type'],
+            query.validated_data['start_time'],
+        )
+        return Response(srz.TeacherShortSrz(teachers, many=True).data)
+
+    @action(['get'], True, 'free-slots')
+    def free_slots(self, *_a, **__):
+        """Slots of the week (or of the date) the teacher has no lesson at."""
+        query = self.get_serializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        teacher = self.get_object()
+        index = AvailabilityIndex.for_branch(
+            self.request.user.branch_id,
+            query.validated_data.get('date'),
+        )
+        slots = [
+            {'days_type': days_type, 'start_time': start_time}
+            for days_type, start_time in index.free_slots(teacher.id)
+        ]
+        return Response(srz.FreeSlotSrz(slots, many=True).data)
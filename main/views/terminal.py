@@ -23,6 +23,8 @@ class TerminalViewSet(ViewSetMixin,
             return srz.TerminalStudentCheckSerializer
         if self.action == 'payment_create':
             return srz.TerminalStudentPaySerializer
+        if self.action == 'payment_batch':
+            return srz.TerminalPaymentBatchSerializer
 
     def get_permissions(self):
         if self.action == 'get_token':
@@ -58,6 +60,18 @@ class TerminalViewSet(ViewSetMixin,
         return Response(serializer.data,
                         status.HTTP_201_CREATED)
 
+    # noinspection PyTypeChecker
+    @action(['post'], False, 'payment-batch')
+    @swagger_auto_schema(responses={
+        status.HTTP_200_OK: srz.TerminalPaymentBatchResultSerializer(many=True),
+    })
+    def payment_batch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response(srz.TerminalPaymentBatchResultSerializer(results, many=True).data,
+                        status.HTTP_200_OK)
+
     def get_success_headers(self, data):
         try:
             return {'Location': str(data[api_settings.URL_FIELD_NAME])}
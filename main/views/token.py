@@ -7,7 +7,7 @@ from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken
 
 from .. import serializers as srz
 
@@ -16,10 +16,10 @@ class TokenViewSet(ViewSetMixin,
                    GenericAPIView):
     def get_serializer_class(self):
         if self.action == 'create':
-            return TokenObtainPairSerializer
+            return srz.BranchTokenObtainPairSerializer
         if self.action == 'refresh':
-            return TokenRefreshSerializer
-        return TokenObtainPairSerializer
+            return srz.BranchTokenRefreshSerializer
+        return srz.BranchTokenObtainPairSerializer
 
     # noinspection PyTypeChecker
     @swagger_auto_schema(responses={status.HTTP_201_CREATED: srz.TokenObtainPairResponseSerializer})
@@ -51,10 +51,11 @@ class TokenViewSet(ViewSetMixin,
         except TokenError as e:
             raise InvalidToken(e.args[0])
 
+        claims = AccessToken(serializer.validated_data['access'], verify=False)
         return Response({
             **serializer.validated_data,
-            'role': serializer.user.role,
-            'branch': serializer.user.branch.name,
-            'fullname': serializer.user.fullname,
+            'role': claims.get('role'),
+            'branch': claims.get('branch'),
+            'fullname': claims.get('fullname'),
         }, status=status.HTTP_200_OK)
 
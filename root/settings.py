@@ -198,10 +198,15 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_URLS_REGEX = r'^/api/.*$'
 CORS_ALLOW_HEADERS = default_headers + ('terminal-authorization',)
 
+# Basic auth for the API, turn it off to accept JWT only
+API_BASIC_AUTH = os.getenv('API_BASIC_AUTH', 'True') == 'True'
+BASIC_AUTH_CACHE_TIMEOUT = int(os.getenv('BASIC_AUTH_CACHE_TIMEOUT', 5 * 60))
+JWT_USER_CACHE_TIMEOUT = int(os.getenv('JWT_USER_CACHE_TIMEOUT', 5 * 60))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        *(('main.authentication.CachedBasicAuthentication',) if API_BASIC_AUTH else ()),
+        'main.authentication.BranchJWTAuthentication',
     ),
     'UNAUTHENTICATED_USER': 'main.models.MyAnonymousUser',
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -234,6 +239,19 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+CACHE_URL = os.getenv('CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+ATTENDANCE_BOARD_CACHE_TIMEOUT = int(os.getenv('ATTENDANCE_BOARD_CACHE_TIMEOUT', 10 * 60))
+TERMINAL_AUTH_CACHE_TIMEOUT = int(os.getenv('TERMINAL_AUTH_CACHE_TIMEOUT', 60))
+MATCHING_INDEX_TIMEOUT = int(os.getenv('MATCHING_INDEX_TIMEOUT', 5 * 60))
+
 # Celery Configuration Options
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.getenv(
@@ -246,3 +264,10 @@ CELERY_TIMEZONE = 'Asia/Bishkek'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+# Number of weeks ahead for which lesson slots of active groups are created
+LESSON_HORIZON_WEEKS = int(os.getenv('LESSON_HORIZON_WEEKS', 4))
+
+# Lessons of groups archived this many months ago are moved to archive tables
+ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', 12))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+